@@ -1,26 +1,42 @@
 #!/usr/bin/env python3
 
 import os
-from flask import Flask, render_template, session, request, abort, redirect, url_for, jsonify
+from flask import Flask, render_template, session, request, abort, redirect, url_for, jsonify, Response, stream_template, stream_with_context, send_file
+from flask.cli import AppGroup
+from jinja2 import FileSystemBytecodeCache
+from werkzeug.security import safe_join
+import click
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import inspect, and_
-from flask_wtf import FlaskForm
-import bcrypt
-from wtforms_alchemy import model_form_factory
+from sqlalchemy import inspect, and_, or_, event
+from sqlalchemy.orm import Session as OrmSession
 from flask_migrate import Migrate
 from uuid import uuid4
-import csv
-import validate
+from typing import Optional, Sequence
+from functools import lru_cache
+import io
+import json
+import mimetypes
+import zlib
+from datetime import date
+from formula import parse_formula, ELEMENTS
+import snapshot
+import backup
+import isotopes
+import calibration
+import assets
 import secrets
 from dotenv import load_dotenv
 
 load_dotenv()
-# from datetime import date
 
 app = Flask(__name__)
 app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///project.db"
 
 app.secret_key = os.getenv('SECRET_KEY', secrets.token_hex(16))
+# compiled templates are shared by all gunicorn workers and kept across restarts.
+os.makedirs(os.path.join(app.instance_path, "jinja_cache"), exist_ok=True)
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache(
+    os.path.join(app.instance_path, "jinja_cache"))
 db: SQLAlchemy = SQLAlchemy()
 migrate = Migrate()
 db.init_app(app)
@@ -33,16 +49,14 @@ def object_as_dict(obj):
     return {c.key: getattr(obj, c.key)
             for c in inspect(obj).mapper.column_attrs}
 
-# Model Forms
-
-
-BaseModelForm = model_form_factory(FlaskForm)
 
-
-class ModelForm(BaseModelForm):
-    @classmethod
-    def get_session(cls):
-        return db.session
+def chunks(seq: Sequence, size: int = 500):
+    """
+    Consecutive slices of seq, small enough to be bound as the parameters of
+    an IN (...) without reaching SQLite's limit on bound parameters.
+    """
+    for i in range(0, len(seq), size):
+        yield seq[i:i + size]
 
 
 class User(db.Model):
@@ -62,10 +76,12 @@ class User(db.Model):
 
     @classmethod
     def generate_password(cls, pw: str):
+        import bcrypt
         return bcrypt.hashpw(pw, bcrypt.gensalt(12))
 
     @classmethod
     def authenticate(cls, username: str, pw: str):
+        import bcrypt
         user = User.query.filter_by(username=username).one_or_none()
         if user and bcrypt.checkpw(pw, user.password):
             session['user'] = user.username
@@ -103,11 +119,14 @@ class Chemical(db.Model):
 
     pubchem_cid = db.Column(db.Integer)
     pubmed_refcount = db.Column(db.Integer)
-    inchikey = db.Column(db.String, nullable=False)
-    inchikey14 = db.Column(db.String)
+    inchikey = db.Column(db.String, nullable=False, index=True)
+    inchikey14 = db.Column(db.String, index=True)
 
-    final_mz = db.Column(db.Float, nullable=False)
-    final_rt = db.Column(db.Float, nullable=False)
+    final_mz = db.Column(db.Float, nullable=False, index=True)
+    final_rt = db.Column(db.Float, nullable=False, index=True)
+    # final_rt mapped onto the common scale by the RtCalibration of the
+    # library and mode, null if there is none. Kept up to date automatically.
+    calibrated_rt = db.Column(db.Float, index=True)
 
     final_adduct = db.Column(db.String, nullable=False)
     detected_adducts = db.Column(db.String)
@@ -118,14 +137,256 @@ class Chemical(db.Model):
     mode = db.Column(db.String)
 
     # serialized into datetime.date
-    createdAt = db.Column(db.Date, default=db.func.now(),
-                          onupdate=db.func.now())
+    # set on the client, so that the change log can serialize a flushed
+    # chemical without reloading a server-side default.
+    createdAt = db.Column(db.Date, default=date.today, onupdate=date.today)
+
+    elements = db.relationship("ChemicalElement", cascade="all, delete-orphan")
+    isotopes = db.relationship("ChemicalIsotope", cascade="all, delete-orphan",
+                               order_by="ChemicalIsotope.shift")
+
+    def index_formula(self):
+        """
+        (Re)builds the element count and isotope envelope rows from the
+        formula string. Must be called whenever the formula is set or changed.
+        """
+        _index_compositions([self], [parse_formula(self.formula)])
+
+
+class ChemicalElement(db.Model):
+    """
+    One row per element in a chemical's formula, so that element-constrained
+    queries are answered by range scans over (element, count).
+    """
+    query: db.Query
+    __table_args__ = (
+        db.Index("ix_chemical_element_element_count",
+                 "element", "count", "chemical_id"),
+    )
+    # a natural key, so that the rows of a flush are inserted in one
+    # executemany instead of one statement each to fetch a generated id.
+    chemical_id = db.Column(db.Integer, db.ForeignKey("chemical.id"),
+                            primary_key=True)
+    element = db.Column(db.String, primary_key=True)
+    count = db.Column(db.Integer, nullable=False)
+
+
+class ChemicalIsotope(db.Model):
+    """
+    One row per peak of a chemical's theoretical isotope envelope, computed
+    from its formula when it is stored, so that observed isotope patterns are
+    scored against it without any computation per request.
+    """
+    query: db.Query
+    chemical_id = db.Column(db.Integer, db.ForeignKey("chemical.id"),
+                            primary_key=True)
+    # nominal mass difference from the monoisotopic peak, i.e. 1 for M+1.
+    shift = db.Column(db.Integer, primary_key=True)
+    # share of all molecules in this peak.
+    abundance = db.Column(db.Float, nullable=False)
+    # exact mass difference from the monoisotopic peak in Da.
+    mass_shift = db.Column(db.Float, nullable=False)
+
+
+def _index_compositions(chemicals: list[Chemical], compositions: list[dict[str, int]]):
+    envelopes = isotopes.envelopes(compositions)
+    for chemical, counts, envelope in zip(chemicals, compositions, envelopes):
+        chemical.elements = [ChemicalElement(element=k, count=v)
+                             for k, v in counts.items()]
+        chemical.isotopes = [ChemicalIsotope(**peak) for peak in envelope or []]
+
+
+def index_formulas(chemicals: list[Chemical]):
+    """
+    Chemical.index_formula for many chemicals at once, with their isotope
+    envelopes computed together. Chemicals whose formula can not be parsed
+    are left without element counts and envelope.
+    """
+    compositions = []
+    for chemical in chemicals:
+        try:
+            compositions.append(parse_formula(chemical.formula))
+        except ValueError:
+            compositions.append({})
+    _index_compositions(chemicals, compositions)
+
+
+class RtCalibration(db.Model):
+    """
+    Calibration of the retention times of one library and mode, fitted to
+    anchor compounds with `flask rt fit`.
+    """
+    query: db.Query
+    __table_args__ = (
+        db.UniqueConstraint("library", "mode"),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    library = db.Column(db.String)
+    mode = db.Column(db.String)
+    method = db.Column(db.String, nullable=False)
+    # json [[raw, calibrated], ...], see calibration.fit
+    knots = db.Column(db.Text, nullable=False)
+    anchors = db.Column(db.Integer, nullable=False)
+    rms_error = db.Column(db.Float, nullable=False)
+
+
+class ChemicalChange(db.Model):
+    """
+    Append-only log of every insert, update and delete of a chemical. seq
+    only ever increases (AUTOINCREMENT never reuses a value), so mirrors can
+    ask for the changes after the last seq they applied.
+    """
+    query: db.Query
+    __table_args__ = (
+        db.Index("ix_chemical_change_chemical_id_seq", "chemical_id", "seq"),
+        {"sqlite_autoincrement": True},
+    )
+    seq = db.Column(db.Integer, primary_key=True)
+    chemical_id = db.Column(db.Integer, nullable=False)
+    # one of "insert", "update" or "delete"
+    op = db.Column(db.String, nullable=False)
+    # the full row as json after the change, null for deletes.
+    data = db.Column(db.Text)
+
+
+class SyncState(db.Model):
+    """The seq of the last change pulled from each upstream server."""
+    query: db.Query
+    source = db.Column(db.String, primary_key=True)
+    seq = db.Column(db.Integer, nullable=False)
+
+
+def chemical_json(chemical: Chemical) -> str:
+    dct = object_as_dict(chemical)
+    if dct["createdAt"] is not None:
+        dct["createdAt"] = dct["createdAt"].isoformat()
+    return json.dumps(dct)
+
+
+# the derived calibrated_rt is not an edit of the chemical, so bulk updates
+# of it leave createdAt as it is instead of applying its onupdate.
+_keep_created = {"createdAt": Chemical.__table__.c.createdAt}
+
+
+def recalibrate_rt(connection, library: Optional[str], mode: Optional[str],
+                   knots: Optional[list[list[float]]]) -> int:
+    """
+    Recomputes calibrated_rt of every chemical of library and mode in bulk
+    (null without knots), bypassing the ORM. Returns the number of chemicals.
+    """
+    table = Chemical.__table__
+    where = and_(table.c.library == library, table.c.mode == mode)
+    if knots is None:
+        return connection.execute(table.update().where(where).values(
+            calibrated_rt=None, **_keep_created)).rowcount
+    rows = connection.execute(db.select(table.c.id, table.c.final_rt).where(where)).all()
+    if not rows:
+        return 0
+    ids, rts = zip(*rows)
+    values = calibration.apply(knots, rts)
+    connection.execute(
+        table.update().where(table.c.id == db.bindparam("_id")).values(
+            calibrated_rt=db.bindparam("_rt"), **_keep_created),
+        [{"_id": id, "_rt": float(rt)} for id, rt in zip(ids, values)])
+    return len(rows)
+
+
+def recalibrate_all_rt(connection) -> int:
+    """recalibrate_rt for every chemical, e.g. after a bulk load."""
+    table = Chemical.__table__
+    connection.execute(table.update().values(calibrated_rt=None, **_keep_created))
+    updated = 0
+    for model in connection.execute(db.select(RtCalibration.__table__)).all():
+        updated += recalibrate_rt(connection, model.library, model.mode, json.loads(model.knots))
+    return updated
+
+
+@event.listens_for(OrmSession, "before_flush")
+def calibrate_chemicals(session, flush_context, instances):
+    """
+    Sets calibrated_rt of the chemicals that are inserted, or whose final_rt,
+    library or mode changed, in the flush. Each library and mode is
+    calibrated with one vectorized call.
+    """
+    groups: dict[tuple, list[Chemical]] = {}
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, Chemical) or obj.final_rt is None:
+            continue
+        state = inspect(obj)
+        if state.persistent and not any(state.attrs[k].history.has_changes()
+                                        for k in ("final_rt", "library", "mode")):
+            continue
+        groups.setdefault((obj.library, obj.mode), []).append(obj)
+    with session.no_autoflush:
+        for (library, mode), chemicals in groups.items():
+            model = session.execute(db.select(RtCalibration).filter_by(
+                library=library, mode=mode)).scalar_one_or_none()
+            if model is None:
+                for chemical in chemicals:
+                    chemical.calibrated_rt = None
+                continue
+            values = calibration.apply(json.loads(model.knots),
+                                       [c.final_rt for c in chemicals])
+            for chemical, value in zip(chemicals, values):
+                chemical.calibrated_rt = float(value)
+
+
+@event.listens_for(OrmSession, "after_flush")
+def record_chemical_changes(session, flush_context):
+    """
+    Writes a ChemicalChange row for every chemical inserted, updated or
+    deleted by the flush, in the same transaction.
+    """
+    changes = []
+    for obj in session.new:
+        if isinstance(obj, Chemical):
+            changes.append(dict(chemical_id=obj.id, op="insert",
+                                data=chemical_json(obj)))
+    for obj in session.dirty:
+        if isinstance(obj, Chemical) and session.is_modified(obj, include_collections=False):
+            changes.append(dict(chemical_id=obj.id, op="update",
+                                data=chemical_json(obj)))
+    for obj in session.deleted:
+        if isinstance(obj, Chemical):
+            changes.append(dict(chemical_id=obj.id, op="delete", data=None))
+    if changes:
+        session.connection().execute(ChemicalChange.__table__.insert(), changes)
+
+
+# Model Forms
+
+
+@lru_cache(maxsize=None)
+def chemical_form():
+    """
+    Builds the Chemical model form class on first use. wtforms_alchemy is
+    the slowest import in the app, so it is kept off the startup path.
+    """
+    from flask_wtf import FlaskForm
+    from wtforms.validators import ValidationError
+    from wtforms_alchemy import model_form_factory
+
+    BaseModelForm = model_form_factory(FlaskForm)
+
+    class ModelForm(BaseModelForm):
+        @classmethod
+        def get_session(cls):
+            return db.session
+
+    class ChemicalForm(ModelForm):
+        class Meta:
+            csrf = False
+            model = Chemical
+            # derived from final_rt, see calibrate_chemicals.
+            exclude = ["calibrated_rt"]
 
+        def validate_formula(self, field):
+            try:
+                parse_formula(field.data or "")
+            except ValueError as e:
+                raise ValidationError(str(e))
 
-class ChemicalForm(ModelForm):
-    class Meta:
-        csrf = False
-        model = Chemical
+    return ChemicalForm
 
 # Error Handlers
 
@@ -250,10 +511,12 @@ def chemical_create():
     if not session.get('admin'):
         abort(403)
     user = User.query.filter_by(username=session.get('user')).one_or_404()
+    ChemicalForm = chemical_form()
     if request.method == "POST":
         form = ChemicalForm(**(request.form | {"person_id": user.id}))
         if form.validate():
             new_chemical = Chemical(**form.data)
+            new_chemical.index_formula()
             db.session.add(new_chemical)
             db.session.commit()
             return render_template("create_chemical.html", form=ChemicalForm(), user=object_as_dict(user), success=True)
@@ -270,12 +533,14 @@ def chemical_update(id: int):
         abort(403)
     current_chemical: Chemical = Chemical.query.filter_by(id=id).one_or_404()
     dct = object_as_dict(current_chemical)
+    ChemicalForm = chemical_form()
     if request.method == "POST":
         form = ChemicalForm(**request.form)
         if form.validate():
             # take the row with id and update it.
             for k in form.data:
                 setattr(current_chemical, k, form.data[k])
+            current_chemical.index_formula()
             db.session.commit()
             return render_template("create_chemical.html", form=form, success=True, id=id)
         else:
@@ -314,6 +579,79 @@ def chemical_all():
     return jsonify(data)
 
 
+def last_change_seq(connection) -> int:
+    """
+    Read before the rows of a snapshot, so that a mirror loaded from it can
+    safely pull the changes after this seq (re-applying a change is harmless).
+    """
+    return connection.execute(db.select(db.func.max(ChemicalChange.seq))).scalar() or 0
+
+
+@app.route("/chemical/snapshot")
+def chemical_snapshot():
+    """
+    Downloads the chemical table as a Parquet (default) or Arrow IPC file,
+    selected with ?format=parquet or ?format=arrow.
+    """
+    if not session.get('admin'):
+        abort(403)
+    output = request.args.get("format", "parquet")
+    if output not in snapshot.FORMATS:
+        abort(404)
+    buffer = io.BytesIO()
+    with db.engine.connect() as connection:
+        snapshot.write_snapshot(
+            connection, Chemical.__table__, buffer, format=output,
+            metadata=dict(change_seq=last_change_seq(connection)))
+    buffer.seek(0)
+    return send_file(buffer, mimetype="application/vnd.apache.parquet" if output == "parquet" else "application/vnd.apache.arrow.file",
+                     as_attachment=True, download_name=f"chemicals.{output}")
+
+
+@app.route("/chemical/changes")
+def chemical_changes():
+    """
+    Streams the changes made after ?since=<seq> as newline-delimited json,
+    oldest first. Only the latest change of each chemical is sent, so the
+    response grows with the number of changed chemicals.
+    """
+    if not session.get('admin'):
+        abort(403)
+    since = request.args.get("since", 0, type=int)
+    latest = db.session.execute(
+        db.select(db.func.max(ChemicalChange.seq))
+        .where(ChemicalChange.seq > since)
+        .group_by(ChemicalChange.chemical_id)
+    ).scalars().all()
+    latest.sort()
+
+    def generate():
+        for seqs in chunks(latest):
+            changes = ChemicalChange.query.filter(
+                ChemicalChange.seq.in_(seqs)
+            ).order_by(ChemicalChange.seq)
+            for change in changes:
+                yield json.dumps({"seq": change.seq, "op": change.op, "id": change.chemical_id,
+                                  "data": change.data and json.loads(change.data)}) + "\n"
+    return compress_stream(Response(stream_with_context(generate()), mimetype="application/x-ndjson"))
+
+
+def search_chemicals(mz_min: float, mz_max: float, rt_min: float, rt_max: float,
+                     calibrated: bool = False) -> list[Chemical]:
+    """
+    The first 20 chemicals inside an m/z and retention time window, on the
+    calibrated retention time scale if calibrated is set. Shared by
+    search_api and the async search service.
+    """
+    rt = Chemical.calibrated_rt if calibrated else Chemical.final_rt
+    mz_filter = and_(mz_max > Chemical.final_mz,
+                     Chemical.final_mz > mz_min)
+    rt_filter = and_(rt_max > rt, rt > rt_min)
+    return Chemical.query.filter(
+        and_(mz_filter, rt_filter)
+    ).limit(20).all()
+
+
 @app.route("/chemical/search", methods=["POST"])
 def search_api():
     query = request.json
@@ -327,22 +665,133 @@ def search_api():
         'year_max')), int(query.get('month_max')), int(query.get('day_max'))
 
     try:
-        mz_filter = and_(mz_max > Chemical.final_mz,
-                         Chemical.final_mz > mz_min)
-        rt_filter = and_(rt_max > Chemical.final_rt,
-                         Chemical.final_rt > rt_min)
+        result = search_chemicals(mz_min, mz_max, rt_min, rt_max,
+                                  bool(query.get('calibrated')))
         # date_filter = date(year_max, month_max, day_max) >= Chemical.createdAt
     except ValueError as e:
         return jsonify({"error": str(e)}), 400
 
-    result = Chemical.query.filter(
-        and_(mz_filter, rt_filter)
-    ).limit(20).all()
+    data = []
+    for x in result:
+        data.append({"id": x.id, "url": url_for("chemical_view", id=x.id),
+                    "name": x.metabolite_name, "mz": x.final_mz, "rt": x.final_rt,
+                     "calibrated_rt": x.calibrated_rt})
+    return jsonify(data)
+
+
+def element_filter(element: str, count_min, count_max):
+    """
+    Filter on the number of atoms of an element, evaluated as a range scan on
+    the (element, count) index. Elements absent from a formula count as 0.
+    """
+    if count_min is not None and count_min > 0:
+        counts = db.select(ChemicalElement.chemical_id).where(
+            ChemicalElement.element == element,
+            ChemicalElement.count >= count_min)
+        if count_max is not None:
+            counts = counts.where(ChemicalElement.count <= count_max)
+        return Chemical.id.in_(counts)
+    # the element may legitimately be absent, so exclude the chemicals that
+    # exceed the maximum instead.
+    too_many = db.select(ChemicalElement.chemical_id).where(
+        ChemicalElement.element == element,
+        ChemicalElement.count > count_max)
+    return Chemical.id.not_in(too_many)
+
+
+@app.route("/chemical/elements", methods=["POST"])
+def element_search_api():
+    """
+    Takes a json body such as
+    {"elements": {"Cl": {"min": 1}, "N": {"max": 2}, "C": {"min": 10, "max": 20}},
+     "mz_min": 100, "mz_max": 300, "rt_min": 0, "rt_max": 500, "mode": "C18neg",
+     "calibrated": true}
+    where every field is optional and calibrated applies the retention time
+    window to calibrated_rt.
+    """
+    query = request.json
+    if query is None:
+        return jsonify([])
+    filters = []
+    try:
+        for element, bounds in (query.get("elements") or {}).items():
+            if element not in ELEMENTS:
+                raise ValueError(f"Unknown element {element}")
+            count_min, count_max = bounds.get("min"), bounds.get("max")
+            count_min = None if count_min is None else int(count_min)
+            count_max = None if count_max is None else int(count_max)
+            if (count_min is not None and count_min < 0) or (count_max is not None and count_max < 0):
+                raise ValueError(f"Atom counts of {element} can not be negative")
+            if count_min is not None and count_max is not None and count_min > count_max:
+                raise ValueError(f"Minimum count of {element} is above its maximum")
+            if (count_min is None or count_min <= 0) and count_max is None:
+                continue
+            filters.append(element_filter(element, count_min, count_max))
+        if query.get("mz_min") is not None and query.get("mz_max") is not None:
+            mz_min, mz_max = float(query["mz_min"]), float(query["mz_max"])
+            filters.append(and_(mz_max > Chemical.final_mz,
+                                Chemical.final_mz > mz_min))
+        if query.get("rt_min") is not None and query.get("rt_max") is not None:
+            rt_min, rt_max = float(query["rt_min"]), float(query["rt_max"])
+            rt = Chemical.calibrated_rt if query.get("calibrated") else Chemical.final_rt
+            filters.append(and_(rt_max > rt, rt > rt_min))
+    except (ValueError, TypeError, AttributeError) as e:
+        return jsonify({"error": str(e)}), 400
+    if query.get("mode"):
+        filters.append(Chemical.mode == query["mode"])
+
+    result = Chemical.query.filter(*filters).limit(20).all()
 
     data = []
     for x in result:
-        data.append({"url": url_for("chemical_view", id=x.id),
-                    "name": x.metabolite_name, "mz": x.final_mz, "rt": x.final_rt})
+        data.append({"id": x.id, "url": url_for("chemical_view", id=x.id),
+                    "name": x.metabolite_name, "formula": x.formula,
+                     "mz": x.final_mz, "rt": x.final_rt, "calibrated_rt": x.calibrated_rt})
+    return jsonify(data)
+
+
+@app.route("/chemical/isotopes", methods=["POST"])
+def isotope_confirm_api():
+    """
+    Scores the observed isotope patterns of candidate hits against their
+    stored envelopes. Takes a json body such as
+    {"candidates": [{"id": 12, "intensities": [100, 11.2, 1.1]}, ...]}
+    with the intensities of M+0, M+1, ... of the feature matched to each
+    candidate. The score is null for chemicals without an envelope.
+    """
+    query = request.json
+    if query is None:
+        return jsonify([])
+    try:
+        candidates = [(int(c["id"]), [float(x) for x in c["intensities"]])
+                      for c in query.get("candidates") or []]
+        for _, intensities in candidates:
+            if not 0 < len(intensities) <= isotopes.PEAKS + 1:
+                raise ValueError(
+                    f"Between 1 and {isotopes.PEAKS + 1} intensities are required")
+    except (ValueError, TypeError, KeyError, AttributeError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    ids = sorted({id for id, _ in candidates})
+    envelopes: dict[int, dict[int, float]] = {}
+    for some in chunks(ids):
+        rows = db.session.execute(db.select(
+            ChemicalIsotope.chemical_id, ChemicalIsotope.shift, ChemicalIsotope.abundance
+        ).where(ChemicalIsotope.chemical_id.in_(some), ChemicalIsotope.shift >= 0))
+        for chemical_id, shift, abundance in rows:
+            envelopes.setdefault(chemical_id, {})[shift] = abundance
+
+    data = []
+    for id, intensities in candidates:
+        expected = envelopes.get(id)
+        if expected is None:
+            data.append({"id": id, "score": None, "expected": None})
+            continue
+        # expected intensities of the observed peaks, relative to the largest.
+        peaks = [expected.get(k, 0.0) for k in range(len(intensities))]
+        top = max(peaks) or 1.0
+        data.append({"id": id, "score": isotopes.score(expected, intensities),
+                     "expected": [p / top for p in peaks]})
     return jsonify(data)
 
 
@@ -351,12 +800,91 @@ def search_api():
 app.config['MAX_CONTENT_LENGTH'] = 3 * 1000 * 1000
 
 
+# what to do with an incoming row that has the same InChIKey, mode and
+# adduct as a stored chemical but differs in some other field.
+MERGE_POLICIES = ("overwrite", "keep", "insert")
+
+
+def structure_key(inchikey: str, inchikey14: Optional[str]) -> str:
+    """
+    The first (connectivity) block of the InChIKey, which is shared by
+    stereoisomers and charge variants of the same structure.
+    """
+    return inchikey14 or inchikey.split("-")[0]
+
+
+def measurement_key(chemical) -> tuple:
+    """
+    Rows sharing this key describe the same compound measured the same way;
+    takes either a validated row or a Chemical.
+    """
+    if isinstance(chemical, dict):
+        def get(k): return chemical.get(k)
+    else:
+        def get(k): return getattr(chemical, k)
+    return (structure_key(get("inchikey"), get("inchikey14")),
+            get("mode"), get("final_adduct"))
+
+
+def find_existing_chemicals(rows: list[dict]) -> dict[tuple, list[Chemical]]:
+    """
+    Loads every stored chemical sharing a structure with the incoming rows
+    in a handful of indexed queries, keyed by measurement_key.
+    """
+    inchikeys = sorted({row["inchikey"] for row in rows})
+    keys14 = sorted({measurement_key(row)[0] for row in rows})
+    found: dict[int, Chemical] = {}
+    for some in chunks(inchikeys):
+        for c in Chemical.query.filter(Chemical.inchikey.in_(some)):
+            found[c.id] = c
+    for some in chunks(keys14):
+        for c in Chemical.query.filter(Chemical.inchikey14.in_(some)):
+            found[c.id] = c
+    # chemicals stored without inchikey14 are found by the first block of
+    # their InChIKey, as index range scans ("." sorts right after "-"); two
+    # parameters per key.
+    for some in chunks(keys14, 250):
+        for c in Chemical.query.filter(or_(*(
+                and_(Chemical.inchikey >= key + "-", Chemical.inchikey < key + ".")
+                for key in some))):
+            found[c.id] = c
+    lookup: dict[tuple, list[Chemical]] = {}
+    for c in found.values():
+        lookup.setdefault(measurement_key(c), []).append(c)
+    return lookup
+
+
+def classify_chemical(row: dict, lookup: dict[tuple, list[Chemical]]) -> tuple[str, Optional[Chemical]]:
+    """
+    Classifies an incoming row as "new", an exact "duplicate" of a chemical,
+    a "variant" of a stored chemical with the same InChIKey, or "related" to
+    one that only shares its first block (e.g. another stereoisomer),
+    returning the match. Only variants may be merged into their match.
+    """
+    candidates = lookup.get(measurement_key(row), [])
+    same_key = [c for c in candidates if c.inchikey == row["inchikey"]]
+    for c in same_key:
+        if all(getattr(c, k) == v for k, v in row.items()):
+            return "duplicate", c
+    # chemicals still pending from the same upload have no id yet, and are
+    # never overwritten by its later rows.
+    for c in same_key:
+        if c.id is not None:
+            return "variant", c
+    for c in candidates:
+        if c.inchikey != row["inchikey"]:
+            return "related", c
+    return "new", None
+
+
 @app.route("/chemical/batchadd", methods=["GET", "POST"])
 def batch_add_request():
     if not session.get('admin'):
         abort(403)
     user = User.query.filter_by(username=session.get('user')).one_or_404()
     if request.method == "POST":
+        import csv
+        import validate
         if "input" not in request.files or request.files["input"].filename == '':
             return render_template("batchadd.html", invalid="Blank file included")
         # save the file to RAM
@@ -374,37 +902,143 @@ def batch_add_request():
                 cleanup()
                 return render_template("batchadd.html", invalid=error)
             else:
-                chemicals = []
+                policy = request.form.get("merge", "overwrite")
+                if policy not in MERGE_POLICIES:
+                    cleanup()
+                    return render_template("batchadd.html", invalid=f"Unknown merge policy {policy}")
+                lookup = find_existing_chemicals(results)
+                counts = {"new": 0, "duplicate": 0, "variant": 0, "related": 0}
+                new_chemicals = []
                 overwritten_chemicals = []
                 for result in results:
-                    overwritten = False
-                    if request.form["overwrite"] == "y":
-                        current_chemical = Chemical.query.filter_by(
-                            metabolite_name=result["metabolite_name"],
-                            formula=result["formula"],
-                        ).first()
-                        if current_chemical is not None:
-                            overwritten = True
-                            for k in result:
-                                setattr(current_chemical, k, result[k])
-                            overwritten_chemicals.append(current_chemical)
-                    if not overwritten:
-                        db.session.add(Chemical(**result, person_id=user.id))
+                    status, current_chemical = classify_chemical(
+                        result, lookup)
+                    counts[status] += 1
+                    if status == "duplicate":
+                        continue
+                    if status == "variant" and policy == "keep":
+                        continue
+                    # a chemical already overwritten by an earlier row keeps it,
+                    # and this row is inserted next to it.
+                    if (status == "variant" and policy == "overwrite"
+                            and current_chemical not in overwritten_chemicals):
+                        for k in result:
+                            setattr(current_chemical, k, result[k])
+                        overwritten_chemicals.append(current_chemical)
+                        continue
+                    new_chemical = Chemical(**result, person_id=user.id)
+                    new_chemicals.append(new_chemical)
+                    # later rows of the same upload are checked against it.
+                    lookup.setdefault(measurement_key(
+                        new_chemical), []).append(new_chemical)
+                # isotope envelopes of the whole upload are computed together.
+                index_formulas(new_chemicals + overwritten_chemicals)
+                db.session.add_all(new_chemicals)
                 db.session.commit()
                 cleanup()
-                return render_template("batchadd.html", success=True, overwritten_chemicals=overwritten_chemicals)
+                return render_template("batchadd.html", success=True, counts=counts, policy=policy, overwritten_chemicals=overwritten_chemicals)
     else:
         return render_template("batchadd.html")
 
 
+def batch_query_results(queries: list[dict], calibrated: bool = False):
+    """
+    Lazily runs each batch query, so that results can be streamed to the
+    client while later queries are still being computed. Retention time
+    windows apply to calibrated_rt if calibrated is set.
+    """
+    rt = Chemical.calibrated_rt if calibrated else Chemical.final_rt
+    for query in queries:
+        mz_filter = and_(query["mz_max"] > Chemical.final_mz,
+                         Chemical.final_mz > query["mz_min"])
+        rt_filter = and_(query["rt_max"] > rt, rt > query["rt_min"])
+        mode_filter = Chemical.mode == query["mode"]
+        # date_filter = query["date"] >= Chemical.createdAt
+        result = Chemical.query.filter(
+            and_(mz_filter, rt_filter, mode_filter)
+            if len(query["mode"]) != 0
+            else and_(mz_filter, rt_filter)
+        ).limit(5).all()
+        hits = []
+        for x in result:
+            hits.append({"id": x.id, "url": url_for("chemical_view", id=x.id),
+                         "name": x.metabolite_name, "mz": x.final_mz, "rt": x.final_rt,
+                         "calibrated_rt": x.calibrated_rt, "final_adduct": x.final_adduct})
+        yield dict(
+            query=query,
+            hits=hits,
+        )
+
+
+_batch_query_columns = ["query", "rt_min", "rt_max", "mz_min", "mz_max", "mode",
+                        "name", "mz", "rt", "calibrated_rt", "final_adduct", "url"]
+
+
+def batch_query_rows(data, delimiter: str):
+    """
+    Yields the batch query results as delimited text, one line per hit (or
+    per query without hits).
+    """
+    import csv
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=delimiter, lineterminator="\n")
+    writer.writerow(_batch_query_columns)
+    for i, result in enumerate(data, 1):
+        query = result["query"]
+        prefix = [i] + [query[k] for k in _batch_query_columns[1:6]]
+        for hit in result["hits"] or [{}]:
+            writer.writerow(
+                prefix + [hit.get(k, "") for k in _batch_query_columns[6:]])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def compress_stream(response: Response, chunk_size=4096) -> Response:
+    """
+    Gzips a streamed response if the client accepts it. Output is flushed
+    every chunk_size bytes so that the client keeps receiving data.
+    """
+    if "gzip" not in request.accept_encodings:
+        return response
+    chunks = response.response
+
+    def generate():
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        pending = 0
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode("utf-8")
+            out = compressor.compress(chunk)
+            pending += len(chunk)
+            if pending >= chunk_size:
+                out += compressor.flush(zlib.Z_SYNC_FLUSH)
+                pending = 0
+            if out:
+                yield out
+        yield compressor.flush()
+    response.response = generate()
+    response.headers["Content-Encoding"] = "gzip"
+    response.headers.add("Vary", "Accept-Encoding")
+    return response
+
+
 # regular users can batch search.
 @app.route("/chemical/batch", methods=["GET", "POST"])
 def batch_query_request():
     if not session.get('user'):
         abort(403)
     if request.method == "POST":
+        import csv
+        import validate
         if "input" not in request.files or request.files["input"].filename == '':
-            return render_template("batchadd.html", invalid="Blank file included")
+            return render_template("batchquery.html", invalid="Blank file included")
+        output = request.form.get("format", "html")
+        if output not in ("html", "tsv", "csv"):
+            return render_template("batchquery.html", invalid=f"Unknown output format {output}")
+        rt_scale = request.form.get("rt", "raw")
+        if rt_scale not in ("raw", "calibrated"):
+            return render_template("batchquery.html", invalid=f"Unknown retention time scale {rt_scale}")
         # save the file to RAM
         file = request.files["input"]
         os.makedirs("/tmp/walkerdb", exist_ok=True)
@@ -416,34 +1050,19 @@ def batch_query_request():
         with open(filename, "r") as csvfile:
             reader = csv.DictReader(csvfile, delimiter="\t")
             queries, error = validate.validate_query_csv_fields(reader)
-            if error:
-                cleanup()
-                return render_template("batchquery.html", invalid=error)
-            else:
-                # generate the queries here.
-                data = []
-                for query in queries:
-                    mz_filter = and_(query["mz_max"] > Chemical.final_mz,
-                                     Chemical.final_mz > query["mz_min"])
-                    rt_filter = and_(query["rt_max"] > Chemical.final_rt,
-                                     Chemical.final_rt > query["rt_min"])
-                    mode_filter = Chemical.mode == query["mode"]
-                    # date_filter = query["date"] >= Chemical.createdAt
-                    result = Chemical.query.filter(
-                        and_(mz_filter, rt_filter, mode_filter)
-                        if len(query["mode"]) != 0
-                        else and_(mz_filter, rt_filter)
-                    ).limit(5).all()
-                    hits = []
-                    for x in result:
-                        hits.append({"url": url_for("chemical_view", id=x.id),
-                                     "name": x.metabolite_name, "mz": x.final_mz, "rt": x.final_rt, "final_adduct": x.final_adduct})
-                    data.append(dict(
-                        query=query,
-                        hits=hits,
-                    ))
-                cleanup()
-                return render_template("batchquery.html", success=True, data=data)
+        cleanup()
+        if error:
+            return render_template("batchquery.html", invalid=error)
+        # the queries themselves are run while the response is streamed.
+        data = batch_query_results(queries, rt_scale == "calibrated")
+        if output == "html":
+            return compress_stream(Response(stream_template("batchquery.html", success=True, data=data), mimetype="text/html"))
+        response = Response(
+            stream_with_context(batch_query_rows(
+                data, "\t" if output == "tsv" else ",")),
+            mimetype="text/tab-separated-values" if output == "tsv" else "text/csv")
+        response.headers["Content-Disposition"] = f"attachment; filename=batch_query.{output}"
+        return compress_stream(response)
     return render_template("batchquery.html")
 
 
@@ -452,6 +1071,337 @@ def search():
     return render_template("search.html")
 
 
+# Static assets
+
+
+# vendored files already warned about, once per process.
+_unvendored: set[str] = set()
+
+
+@app.template_global()
+def asset(filename: str) -> str:
+    """
+    Fingerprinted URL of a file under static/, which browsers may cache
+    forever. Vendored files that haven't been fetched yet use their CDN.
+    """
+    if app.debug:
+        assets.digest.cache_clear()
+    hash = assets.digest(os.path.join(app.static_folder, filename))
+    if hash is None:
+        if filename in assets.VENDORED:
+            if filename not in _unvendored:
+                _unvendored.add(filename)
+                app.logger.warning("%s is not vendored, loading it from %s; "
+                                   "run `flask assets vendor`", filename, assets.VENDORED[filename])
+            return assets.VENDORED[filename]
+        raise ValueError(f"Static file {filename} does not exist")
+    return url_for("asset_file", filename=assets.fingerprint(filename, hash))
+
+
+@app.route("/assets/<path:filename>")
+def asset_file(filename: str):
+    original, hash = assets.split_fingerprint(filename)
+    path = safe_join(app.static_folder, original)
+    if not hash or path is None or assets.digest(path) != hash:
+        abort(404)
+    mimetype = mimetypes.guess_type(original)[0] or "application/octet-stream"
+    encoding = None
+    for name, suffix in assets.ENCODINGS:
+        if name in request.accept_encodings and os.path.isfile(path + suffix):
+            encoding, path = name, path + suffix
+            break
+    response = send_file(path, mimetype=mimetype, max_age=365 * 24 * 3600)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+@app.route("/source/validate.py")
+def validate_source():
+    return send_file(os.path.join(app.root_path, "validate.py"), mimetype="text/plain")
+
+
+# Command line utilities, run with `flask snapshot ...`
+snapshot_cli = AppGroup("snapshot", help="Columnar snapshots of the chemical table.")
+app.cli.add_command(snapshot_cli)
+
+
+@snapshot_cli.command("export")
+@click.argument("path", type=click.Path(dir_okay=False, writable=True))
+@click.option("--format", "output", type=click.Choice(snapshot.FORMATS), default="parquet")
+def snapshot_export(path: str, output: str):
+    """Writes every chemical to a Parquet or Arrow file."""
+    with db.engine.connect() as connection, open(path, "wb") as sink:
+        seq = last_change_seq(connection)
+        rows = snapshot.write_snapshot(
+            connection, Chemical.__table__, sink, format=output,
+            metadata=dict(change_seq=seq))
+    click.echo(f"Wrote {rows} chemicals up to change seq {seq} to {path}")
+
+
+@snapshot_cli.command("import")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+def snapshot_import(path: str):
+    """Loads a Parquet or Arrow snapshot into an empty database."""
+    with db.engine.begin() as connection, open(path, "rb") as source:
+        try:
+            metadata = snapshot.read_metadata(source)
+            rows = snapshot.read_snapshot(
+                connection, Chemical.__table__, ChemicalElement.__table__,
+                ChemicalIsotope.__table__, source)
+            # calibrated times in the snapshot come from the calibrations of
+            # the server it was taken on.
+            recalibrate_all_rt(connection)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+    click.echo(f"Loaded {rows} chemicals from {path}")
+    if "change_seq" in metadata:
+        click.echo(
+            f"Pull later changes with `flask sync pull <url> --since {metadata['change_seq']}`")
+
+
+assets_cli = AppGroup("assets", help="Self-hosted static assets.")
+app.cli.add_command(assets_cli)
+
+
+@assets_cli.command("vendor")
+@click.option("--force", is_flag=True, help="Download files that already exist again.")
+def assets_vendor(force: bool):
+    """Downloads third-party front-end assets into static/vendor."""
+    try:
+        fetched = assets.vendor(app.static_folder, force=force)
+    except OSError as e:
+        # fails the docker build rather than shipping an image without them.
+        raise click.ClickException(f"Could not vendor the front-end assets: {e}")
+    for filename in fetched:
+        click.echo(f"Fetched {filename}")
+
+
+@assets_cli.command("compress")
+def assets_compress():
+    """Writes gzip and brotli variants of the static files."""
+    written = assets.compress(app.static_folder)
+    click.echo(f"Wrote {len(written)} compressed files"
+               + ("" if assets.brotli else " (install brotli for .br variants)"))
+
+
+backup_cli = AppGroup("backup", help="Online backups of the database.")
+app.cli.add_command(backup_cli)
+
+
+@backup_cli.command("create")
+@click.option("--dir", "directory", type=click.Path(file_okay=False), default=None,
+              help="Where backups are kept (default: instance/backups).")
+@click.option("--method", type=click.Choice(backup.METHODS), default="auto",
+              help="backup: SQLite backup API in steps; vacuum: VACUUM INTO; auto: vacuum in WAL mode, otherwise backup.")
+@click.option("--pages", type=int, default=256, help="Pages copied per backup step.")
+@click.option("--sleep", type=float, default=0.01, help="Seconds to yield to writers between steps.")
+@click.option("--max-restarts", type=int, default=3,
+              help="Concurrent writes restart a stepped copy; after this many restarts the rest is copied in one step.")
+@click.option("--keep", type=click.IntRange(min=1), default=7, help="Number of backups to keep.")
+@click.option("--every", type=float, default=None, help="Keep running, taking a backup every this many seconds.")
+def backup_create(directory: Optional[str], method: str, pages: int, sleep: float, max_restarts: int, keep: int, every: Optional[float]):
+    """Takes a compressed backup without stopping the app."""
+    import time
+    directory = directory or os.path.join(app.instance_path, "backups")
+    while True:
+        try:
+            stats = backup.backup_database(db.engine.url.database, directory, method=method,
+                                           pages=pages, sleep=sleep, keep=keep, max_restarts=max_restarts)
+        except Exception as e:
+            if every is None:
+                raise
+            # a failed run, e.g. a full disk, must not end the schedule.
+            click.echo(f"Backup failed: {e}", err=True)
+            time.sleep(every)
+            continue
+        click.echo(f"Wrote {stats['path']} ({stats['database_bytes'] / 1e6:.1f} MB -> "
+                   f"{stats['compressed_bytes'] / 1e6:.1f} MB) with {stats['method']}")
+        click.echo(f"  copy {stats['copy_seconds']:.2f}s in {stats['steps']} steps "
+                   f"({stats['restarts']} restarts by concurrent writes), "
+                   f"compress {stats['compress_seconds']:.2f}s")
+        click.echo(f"  writers blocked at most {stats['max_step_seconds'] * 1000:.1f} ms "
+                   f"(mean {stats['mean_step_seconds'] * 1000:.1f} ms) per step")
+        for path in stats["removed"]:
+            click.echo(f"  removed {path}")
+        if every is None:
+            break
+        time.sleep(every)
+
+
+def apply_chemical_changes(changes: list[dict]):
+    """
+    Applies changes streamed from /chemical/changes to the local database,
+    keeping the upstream ids. The caller commits.
+    """
+    ids = [change["id"] for change in changes]
+    existing = {c.id: c for c in Chemical.query.filter(Chemical.id.in_(ids))}
+    changed = {}
+    for change in changes:
+        chemical = existing.get(change["id"])
+        if change["op"] == "delete":
+            if chemical is not None:
+                db.session.delete(chemical)
+                existing.pop(change["id"])
+                changed.pop(change["id"], None)
+            continue
+        data = change["data"]
+        # calibrations are local, so calibrated_rt is recomputed on flush.
+        data.pop("calibrated_rt", None)
+        if data["createdAt"] is not None:
+            data["createdAt"] = date.fromisoformat(data["createdAt"])
+        if chemical is None:
+            chemical = Chemical(**data)
+            db.session.add(chemical)
+            existing[chemical.id] = chemical
+        else:
+            for k in data:
+                setattr(chemical, k, data[k])
+        changed[chemical.id] = chemical
+    index_formulas(list(changed.values()))
+
+
+sync_cli = AppGroup("sync", help="Incremental sync from an upstream server.")
+app.cli.add_command(sync_cli)
+
+
+@sync_cli.command("pull")
+@click.argument("url")
+@click.option("--username", envvar="SYNC_USERNAME", required=True, help="Upstream admin user (or $SYNC_USERNAME).")
+@click.option("--password", envvar="SYNC_PASSWORD", required=True, help="Upstream admin password (or $SYNC_PASSWORD).")
+@click.option("--since", type=int, default=None,
+              help="Pull the changes after this seq instead of the last one pulled, e.g. the change_seq of the snapshot this mirror was loaded from.")
+def sync_pull(url: str, username: str, password: str, since: Optional[int]):
+    """Pulls and applies the changes made on the server at URL."""
+    import gzip
+    import http.cookiejar
+    import urllib.error
+    import urllib.parse
+    import urllib.request
+
+    url = url.rstrip("/")
+    state = db.session.get(SyncState, url) or SyncState(source=url, seq=0)
+    if since is not None:
+        state.seq = since
+    cookies = http.cookiejar.CookieJar()
+    opener = urllib.request.build_opener(
+        urllib.request.HTTPCookieProcessor(cookies))
+    try:
+        opener.open(url + "/accounts/login", urllib.parse.urlencode(
+            dict(username=username, password=password)).encode()).read()
+        # the login page answers 200 either way; only a session cookie
+        # tells that it worked.
+        if not any(cookie.name == "session" for cookie in cookies):
+            raise click.ClickException(f"Could not log in to {url} as {username}")
+        response = opener.open(urllib.request.Request(
+            f"{url}/chemical/changes?since={state.seq}", headers={"Accept-Encoding": "gzip"}))
+    except urllib.error.URLError as e:
+        raise click.ClickException(f"Could not fetch changes from {url}: {e}")
+    if response.headers.get_content_type() != "application/x-ndjson":
+        # e.g. the forbidden page, which is also served with status 200.
+        raise click.ClickException(
+            f"{url} did not return changes; is {username} an admin there?")
+    if response.headers.get("Content-Encoding") == "gzip":
+        response = gzip.GzipFile(fileobj=response)
+
+    applied = 0
+    batch = []
+
+    def flush():
+        apply_chemical_changes(batch)
+        state.seq = batch[-1]["seq"]
+        db.session.merge(state)
+        db.session.commit()
+        batch.clear()
+    for line in response:
+        if line.strip():
+            batch.append(json.loads(line))
+            applied += 1
+        if len(batch) >= 500:
+            flush()
+    if batch:
+        flush()
+    else:
+        # a --since without newer changes is kept for the next pull, too.
+        db.session.merge(state)
+        db.session.commit()
+    click.echo(f"Applied {applied} changes from {url}, now at seq {state.seq}")
+
+
+rt_cli = AppGroup("rt", help="Retention time calibration per library and mode.")
+app.cli.add_command(rt_cli)
+
+
+@rt_cli.command("fit")
+@click.argument("anchors", type=click.File("r"))
+@click.option("--library", required=True)
+@click.option("--mode", required=True)
+@click.option("--method", type=click.Choice(calibration.METHODS), default="linear", show_default=True)
+def rt_fit(anchors, library: str, mode: str, method: str):
+    """
+    Fits the calibration of a library and mode to ANCHORS, a tab-delimited
+    file with the inchikey and reference rt of anchor compounds, and
+    recomputes the calibrated retention times of its chemicals.
+    """
+    import csv
+    reference = {}
+    for row in csv.DictReader(anchors, delimiter="\t"):
+        try:
+            reference[row["inchikey"].strip()] = float(row["rt"])
+        except (KeyError, TypeError, ValueError):
+            raise click.ClickException(
+                f"Line {row} needs an inchikey and a numeric rt")
+    raw, expected = [], []
+    keys = sorted(reference)
+    for some in chunks(keys):
+        for inchikey, rt in db.session.execute(db.select(Chemical.inchikey, Chemical.final_rt).where(
+                Chemical.library == library, Chemical.mode == mode,
+                Chemical.inchikey.in_(some))):
+            raw.append(rt)
+            expected.append(reference[inchikey])
+    try:
+        knots = calibration.fit(raw, expected, method)
+    except ValueError as e:
+        raise click.ClickException(f"{e} (found {len(raw)} anchors in {library} {mode})")
+
+    model = RtCalibration.query.filter_by(library=library, mode=mode).one_or_none() \
+        or RtCalibration(library=library, mode=mode)
+    model.method = method
+    model.knots = json.dumps(knots)
+    model.anchors = len(raw)
+    model.rms_error = calibration.rms_error(knots, raw, expected)
+    db.session.add(model)
+    updated = recalibrate_rt(db.session.connection(), library, mode, knots)
+    db.session.commit()
+    click.echo(f"Fitted {library} {mode} to {len(raw)} anchors, rms error {model.rms_error:.3f}; "
+               f"recalibrated {updated} chemicals")
+
+
+@rt_cli.command("list")
+def rt_list():
+    """Lists the fitted calibrations."""
+    for model in RtCalibration.query.order_by(RtCalibration.library, RtCalibration.mode):
+        click.echo(f"{model.library}\t{model.mode}\t{model.method}\t"
+                   f"{model.anchors} anchors\trms error {model.rms_error:.3f}")
+
+
+@rt_cli.command("drop")
+@click.option("--library", required=True)
+@click.option("--mode", required=True)
+def rt_drop(library: str, mode: str):
+    """Deletes a calibration, clearing the calibrated retention times."""
+    model = RtCalibration.query.filter_by(library=library, mode=mode).one_or_none()
+    if model is None:
+        raise click.ClickException(f"There is no calibration for {library} {mode}")
+    db.session.delete(model)
+    updated = recalibrate_rt(db.session.connection(), library, mode, None)
+    db.session.commit()
+    click.echo(f"Dropped the calibration of {library} {mode}; cleared {updated} chemicals")
+
+
 if __name__ == "__main__":
     with app.app_context():
         db.create_all()
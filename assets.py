@@ -0,0 +1,100 @@
+import gzip
+import hashlib
+import os
+from functools import lru_cache
+from typing import Optional
+
+try:
+    import brotli
+except ImportError:  # brotli variants are skipped without it.
+    brotli = None
+
+"""
+Self-hosted front-end assets. Files under static/ are served from
+/assets/<name>.<content hash>.<ext> so that they can be cached forever, with
+gzip and brotli variants compressed once ahead of time.
+"""
+
+# third-party assets that used to be loaded from CDNs, fetched into static/
+# by `flask assets vendor` (done when the docker image is built).
+VENDORED = {
+    "vendor/simple.min.css": "https://cdn.simplecss.org/simple.min.css",
+    "vendor/vue.min.js": "https://cdn.jsdelivr.net/npm/vue@2.7.14/dist/vue.min.js",
+    "vendor/highlight.min.js": "https://cdnjs.cloudflare.com/ajax/libs/highlight.js/11.7.0/highlight.min.js",
+    "vendor/highlight-default.min.css": "https://cdnjs.cloudflare.com/ajax/libs/highlight.js/11.7.0/styles/default.min.css",
+}
+
+# precompressed variants in order of preference: (encoding, file suffix).
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+
+_compressible = (".css", ".js", ".svg", ".txt", ".json", ".map", ".html")
+
+
+@lru_cache(maxsize=None)
+def digest(path: str) -> Optional[str]:
+    """Short content hash of a file, or None if it does not exist."""
+    if not os.path.isfile(path):
+        return None
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:12]
+
+
+def fingerprint(filename: str, hash: str) -> str:
+    """vendor/vue.min.js -> vendor/vue.min.<hash>.js"""
+    base, ext = os.path.splitext(filename)
+    return f"{base}.{hash}{ext}"
+
+
+def split_fingerprint(filename: str) -> tuple[str, str]:
+    """vendor/vue.min.<hash>.js -> (vendor/vue.min.js, <hash>)"""
+    base, ext = os.path.splitext(filename)
+    base, _, hash = base.rpartition(".")
+    return base + ext, hash
+
+
+def vendor(static_folder: str, force: bool = False) -> list[str]:
+    """
+    Downloads the VENDORED assets that are missing, returning their names.
+    Raises OSError (urllib.error.URLError included) if a download fails.
+    """
+    import urllib.request
+    fetched = []
+    for filename, url in VENDORED.items():
+        path = os.path.join(static_folder, filename)
+        if os.path.exists(path) and not force:
+            continue
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with urllib.request.urlopen(url, timeout=30) as response:
+            data = response.read()
+        if not data:
+            raise OSError(f"{url} returned an empty file")
+        # written aside and renamed, so that an interrupted download is not
+        # taken for a vendored file by the next run.
+        with open(path + ".partial", "wb") as f:
+            f.write(data)
+        os.replace(path + ".partial", path)
+        fetched.append(filename)
+    return fetched
+
+
+def compress(static_folder: str) -> list[str]:
+    """
+    Writes .gz (and .br, if brotli is installed) variants next to every
+    compressible file under static_folder, returning the paths written.
+    """
+    written = []
+    for directory, _, files in os.walk(static_folder):
+        for name in files:
+            if not name.endswith(_compressible):
+                continue
+            path = os.path.join(directory, name)
+            with open(path, "rb") as f:
+                data = f.read()
+            with open(path + ".gz", "wb") as f:
+                f.write(gzip.compress(data, compresslevel=9, mtime=0))
+            written.append(path + ".gz")
+            if brotli is not None:
+                with open(path + ".br", "wb") as f:
+                    f.write(brotli.compress(data, quality=11))
+                written.append(path + ".br")
+    return written
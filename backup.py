@@ -0,0 +1,133 @@
+import gzip
+import os
+import shutil
+import sqlite3
+import time
+from datetime import datetime
+
+"""
+Online backups of the SQLite database that don't stop the app. The copy is
+taken with SQLite's backup API a few pages at a time, sleeping between steps
+so that writers can commit, or with VACUUM INTO when the database is in WAL
+mode (where readers never block writers). The copy is then gzipped and old
+backups are pruned.
+"""
+
+METHODS = ("auto", "backup", "vacuum")
+
+_prefix = "project-"
+_suffix = ".db.gz"
+
+
+class _Restarted(Exception):
+    pass
+
+
+def _backup_steps(source: sqlite3.Connection, target: sqlite3.Connection,
+                  pages: int, sleep: float, max_restarts: int) -> tuple[list[float], int]:
+    # the shared lock on the source is only held inside each step, so the
+    # time of a step bounds how long a writer can be kept waiting by it.
+    steps: list[float] = []
+    restarts = 0
+    last = time.perf_counter()
+    previous = None
+
+    def progress(status, remaining, total):
+        nonlocal last, previous, restarts
+        steps.append(time.perf_counter() - last)
+        # SQLite starts over whenever another connection writes to the source.
+        if previous is not None and remaining >= previous:
+            restarts += 1
+            if restarts > max_restarts:
+                raise _Restarted()
+        previous = remaining
+        if remaining and sleep:
+            time.sleep(sleep)
+        last = time.perf_counter()
+    try:
+        source.backup(target, pages=pages, progress=progress)
+    except _Restarted:
+        # under a steady stream of writes the copy would never finish, so
+        # take the rest in one step, which locks out writers while it runs.
+        last = time.perf_counter()
+        source.backup(target, pages=-1)
+        steps.append(time.perf_counter() - last)
+    return steps, restarts
+
+
+def prune_backups(directory: str, keep: int) -> list[str]:
+    """Deletes all but the newest keep backups, returning the deleted paths."""
+    backups = sorted(f for f in os.listdir(directory)
+                     if f.startswith(_prefix) and f.endswith(_suffix))
+    removed = []
+    for name in backups[:max(len(backups) - keep, 0)]:
+        path = os.path.join(directory, name)
+        os.remove(path)
+        removed.append(path)
+    return removed
+
+
+def backup_database(database: str, directory: str, method: str = "auto",
+                    pages: int = 256, sleep: float = 0.01, keep: int = 7,
+                    max_restarts: int = 3) -> dict:
+    """
+    Writes a gzipped, consistent copy of database into directory and keeps
+    the newest keep backups. Returns timing statistics of the copy.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown backup method {method}")
+    if keep < 1:
+        # the backup being written would be pruned right away.
+        raise ValueError("At least one backup must be kept")
+    os.makedirs(directory, exist_ok=True)
+    # down to the microsecond, so that backups taken within the same second
+    # do not overwrite each other; the names still sort by time.
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+    path = os.path.join(directory, f"{_prefix}{stamp}{_suffix}")
+    partial = os.path.join(directory, f".{_prefix}{stamp}.db.partial")
+
+    start = time.perf_counter()
+    source = sqlite3.connect(f"file:{database}?mode=ro", uri=True)
+    try:
+        if method == "auto":
+            journal_mode = source.execute("PRAGMA journal_mode").fetchone()[0]
+            method = "vacuum" if journal_mode == "wal" else "backup"
+        if method == "vacuum":
+            source.execute("VACUUM INTO ?", (partial,))
+            steps, restarts = [time.perf_counter() - start], 0
+        else:
+            target = sqlite3.connect(partial)
+            try:
+                steps, restarts = _backup_steps(
+                    source, target, pages, sleep, max_restarts)
+            finally:
+                target.close()
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    finally:
+        source.close()
+    copied = time.perf_counter()
+
+    # compression runs after the source is closed, so it holds no locks.
+    with open(partial, "rb") as f_in, gzip.open(path + ".partial", "wb", compresslevel=6) as f_out:
+        shutil.copyfileobj(f_in, f_out, 1024 * 1024)
+    os.replace(path + ".partial", path)
+    size = os.path.getsize(partial)
+    os.remove(partial)
+    removed = prune_backups(directory, keep)
+
+    return dict(
+        path=path,
+        method=method,
+        database_bytes=size,
+        compressed_bytes=os.path.getsize(path),
+        copy_seconds=copied - start,
+        compress_seconds=time.perf_counter() - copied,
+        steps=len(steps),
+        restarts=restarts,
+        max_step_seconds=max(steps, default=0),
+        mean_step_seconds=sum(steps) / len(steps) if steps else 0,
+        removed=removed,
+    )
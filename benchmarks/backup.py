@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+
+"""
+Measures how online backups affect concurrent writers: a writer thread
+commits small updates to a seeded throwaway database while backups are taken
+with each method, and its commit latency is compared with an idle baseline.
+
+Usage: python benchmarks/backup.py [chemicals]
+"""
+
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+from loadtest import percentile, root, seed
+
+
+def writer(database: str, stop: threading.Event, latencies: list[float]):
+    connection = sqlite3.connect(database, timeout=60)
+    (count,) = connection.execute("SELECT count(*) FROM chemical").fetchone()
+    while not stop.is_set():
+        start = time.perf_counter()
+        connection.execute("UPDATE chemical SET msms_purity = ? WHERE id = ?",
+                           (random.random(), random.randint(1, count)))
+        connection.commit()
+        latencies.append(time.perf_counter() - start)
+        time.sleep(0.005)
+    connection.close()
+
+
+def measure(database: str, action) -> tuple[list[float], float]:
+    latencies: list[float] = []
+    stop = threading.Event()
+    thread = threading.Thread(target=writer, args=(database, stop, latencies))
+    thread.start()
+    time.sleep(0.5)
+    start = time.perf_counter()
+    action()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    thread.join()
+    return latencies, elapsed
+
+
+def report(name: str, latencies: list[float], elapsed: float):
+    ms = [x * 1000 for x in latencies]
+    print(f"{name:<34} {elapsed:8.2f} s {len(ms):8} {percentile(ms, 50):8.1f}"
+          f" {percentile(ms, 99):8.1f} {max(ms):8.1f}")
+
+
+def main(chemicals: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        tree = os.path.join(tmp, "tree")
+        shutil.copytree(root, tree, ignore=shutil.ignore_patterns(
+            "instance", ".git", "__pycache__"))
+        seed(tree, chemicals)
+        import backup
+        database = os.path.join(tree, "instance", "project.db")
+        directory = os.path.join(tmp, "backups")
+        print(f"database is {os.path.getsize(database) / 1e6:.1f} MB")
+        print(f"{'':<34} {'duration':>10} {'writes':>8} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+
+        report("no backup", *measure(database, lambda: time.sleep(3)))
+
+        def copy():
+            # a plain file copy of a live database, for comparison.
+            connection = sqlite3.connect(database)
+            connection.execute("BEGIN IMMEDIATE")
+            shutil.copyfile(database, os.path.join(tmp, "copy.db"))
+            connection.rollback()
+            connection.close()
+        report("locked file copy", *measure(database, copy))
+        for name, kwargs in [
+            ("backup API, single step", dict(method="backup", pages=-1)),
+            ("backup API, 256 pages + 10 ms", dict(method="backup", pages=256, sleep=0.01)),
+            ("VACUUM INTO", dict(method="vacuum")),
+        ]:
+            report(name, *measure(database, lambda: backup.backup_database(
+                database, directory, **kwargs)))
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
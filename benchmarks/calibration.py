@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+"""
+Measures retention time calibration on a seeded throwaway database where
+half of the chemicals come from a second library whose retention times are
+stretched and shifted: the time to fit and recompute calibrated_rt in bulk,
+and the hits and time per query of searching the raw retention times with
+windows wide enough for both libraries against the calibrated ones with a
+tight window.
+
+Usage: python benchmarks/calibration.py [chemicals]
+"""
+
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+from loadtest import root, seed
+
+# the second library elutes later and more slowly.
+SCALE, OFFSET = 1.1, 20.0
+# tolerance of a search on the common scale, and noise of the anchors.
+TOLERANCE, NOISE = 2.0, 0.5
+
+
+def main(chemicals: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        tree = os.path.join(tmp, "tree")
+        shutil.copytree(root, tree, ignore=shutil.ignore_patterns(
+            "instance", ".git", "__pycache__"))
+        seed(tree, chemicals)
+        database = os.path.join(tree, "instance", "project.db")
+        connection = sqlite3.connect(database)
+        connection.execute("UPDATE chemical SET library = 'shifted', "
+                           "final_rt = final_rt * ? + ? WHERE id % 2 = 0", (SCALE, OFFSET))
+        connection.commit()
+        rows = connection.execute("SELECT library, mode, inchikey, final_rt FROM chemical").fetchall()
+        connection.close()
+
+        from app import app, db, Chemical, and_
+        runner = app.test_cli_runner()
+        groups: dict[tuple, list] = {}
+        for library, mode, inchikey, rt in rows:
+            groups.setdefault((library, mode), []).append((inchikey, rt))
+        start = time.perf_counter()
+        for (library, mode), members in groups.items():
+            path = os.path.join(tmp, "anchors.tsv")
+            with open(path, "w") as f:
+                f.write("inchikey\trt\n")
+                for inchikey, rt in random.sample(members, 50):
+                    if library == "shifted":
+                        rt = (rt - OFFSET) / SCALE
+                    f.write(f"{inchikey}\t{rt + random.gauss(0, NOISE):.3f}\n")
+            result = runner.invoke(args=["rt", "fit", path, "--library", library, "--mode", mode])
+            assert result.exit_code == 0, result.output
+        print(f"fit and recalibrate {len(groups)} library/modes: "
+              f"{(time.perf_counter() - start) * 1000:.1f} ms")
+
+        with app.app_context():
+            targets = random.sample(Chemical.query.all(), 500)
+            print(f"{'':<24} {'hits/query':>10} {'ms/query':>10}")
+            for name, calibrated in (("raw, widened window", False),
+                                     ("calibrated, tight", True)):
+                hits = 0
+                start = time.perf_counter()
+                for target in targets:
+                    true_rt = target.calibrated_rt
+                    if calibrated:
+                        low, high = true_rt - TOLERANCE, true_rt + TOLERANCE
+                        rt = Chemical.calibrated_rt
+                    else:
+                        # must cover where either library measures the compound.
+                        low = true_rt - TOLERANCE
+                        high = (true_rt + TOLERANCE) * SCALE + OFFSET
+                        rt = Chemical.final_rt
+                    hits += Chemical.query.filter(and_(
+                        target.final_mz + 0.5 > Chemical.final_mz,
+                        Chemical.final_mz > target.final_mz - 0.5,
+                        high > rt, rt > low)).count()
+                elapsed = time.perf_counter() - start
+                print(f"{name:<24} {hits / len(targets):10.1f} {elapsed / len(targets) * 1000:10.3f}")
+            db.engine.dispose()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+
+"""
+Measures isotope envelope precomputation and batch confirmation: envelopes
+computed one formula at a time against all at once, and the time for
+/chemical/isotopes to score a batch of candidates against the stored
+envelopes of a seeded throwaway database.
+
+Usage: python benchmarks/isotopes.py [chemicals]
+"""
+
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from loadtest import random_chemical, root, seed
+
+
+def report(name: str, seconds: float, count: int):
+    print(f"{name:<36} {seconds * 1000:10.1f} ms {seconds / count * 1e6:10.1f} us each")
+
+
+def main(chemicals: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        tree = os.path.join(tmp, "tree")
+        shutil.copytree(root, tree, ignore=shutil.ignore_patterns(
+            "instance", ".git", "__pycache__"))
+        seed(tree, chemicals)
+        import isotopes
+        from app import app, Chemical
+        from formula import parse_formula
+
+        compositions = [parse_formula(random_chemical()["formula"])
+                        for _ in range(chemicals)]
+        start = time.perf_counter()
+        for counts in compositions[:1000]:
+            isotopes.envelopes([counts])
+        report("envelopes, one at a time (1000)", time.perf_counter() - start, 1000)
+        start = time.perf_counter()
+        isotopes.envelopes(compositions)
+        report(f"envelopes, all at once ({chemicals})",
+               time.perf_counter() - start, chemicals)
+
+        with app.app_context():
+            ids = [id for (id,) in Chemical.query.with_entities(Chemical.id)]
+        client = app.test_client()
+        for size in (10, 100, 1000):
+            candidates = [{"id": random.choice(ids),
+                           "intensities": [1.0, random.uniform(0, 0.4), random.uniform(0, 0.1)]}
+                          for _ in range(size)]
+            start = time.perf_counter()
+            response = client.post("/chemical/isotopes", json={"candidates": candidates})
+            assert response.status_code == 200
+            report(f"/chemical/isotopes, {size} candidates",
+                   time.perf_counter() - start, size)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+
+"""
+Load test of the deployed stack: starts the app under gunicorn against a
+seeded SQLite database in a throwaway copy of the repository, then drives a
+mix of search, view, batch search, batch add and login traffic from many
+concurrent clients. Latency percentiles, throughput, error and database lock
+rates are reported per endpoint.
+
+Usage: python benchmarks/loadtest.py --clients 32 --duration 30 \
+           --mix search=60,view=25,batch=8,batchadd=2,login=5
+"""
+
+import argparse
+import http.client
+import http.cookiejar
+import json
+import os
+import random
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from uuid import uuid4
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+USERNAME = "loadtest"
+PASSWORD = "loadtest"
+MODES = ["HILICneg", "HILICpos", "C18neg", "C18pos"]
+ADDUCTS = ["M+H", "M-H", "M+Na", "M+NH4"]
+ENDPOINTS = ["search", "view", "batch", "batchadd", "login"]
+
+_insert_columns = ["metabolite_name", "formula", "monoisotopic_mass", "final_mz",
+                   "final_rt", "final_adduct", "standard_grp", "msms_detected",
+                   "inchikey", "inchikey14", "library", "mode"]
+
+
+def random_inchikey() -> str:
+    letters = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    return "-".join(["".join(random.choices(letters, k=n)) for n in (14, 10, 1)])
+
+
+def random_chemical() -> dict:
+    c, h, n, o = (random.randint(1, 30), random.randint(1, 50),
+                  random.randint(0, 5), random.randint(0, 10))
+    mass = 12 * c + 1.007825 * h + 14.003074 * n + 15.994915 * o
+    inchikey = random_inchikey()
+    return dict(
+        metabolite_name=f"compound-{uuid4().hex[:8]}",
+        formula=f"C{c}H{h}" + (f"N{n}" if n else "") + (f"O{o}" if o else ""),
+        monoisotopic_mass=round(mass, 5),
+        final_mz=round(mass + 1.007276, 5),
+        final_rt=round(random.uniform(10, 900), 2),
+        final_adduct=random.choice(ADDUCTS),
+        standard_grp="Loadtest",
+        msms_detected=random.random() < 0.5,
+        inchikey=inchikey,
+        inchikey14=inchikey[:14],
+        library="loadtest",
+        mode=random.choice(MODES),
+    )
+
+
+def random_window() -> dict:
+    mz, rt = random.uniform(50, 900), random.uniform(10, 900)
+    ppm = mz * 10 / 10**6
+    return dict(mz_min=mz - ppm, mz_max=mz + ppm, rt_min=rt - 15, rt_max=rt + 15)
+
+
+def seed(tree: str, chemicals: int):
+    """Creates the database with initialize_db.py and fills it in-process."""
+    subprocess.run([sys.executable, "initialize_db.py"], cwd=tree, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    sys.path.insert(0, tree)
+    from app import app, db, User, Chemical, index_formulas
+    with app.app_context():
+        db.session.add(User(username=USERNAME, email="loadtest@localhost",
+                            name="Load Test", institution="-", position="-",
+                            password=User.generate_password(PASSWORD), admin=True))
+        user = User.query.filter_by(username=USERNAME).one()
+        batch = [Chemical(**random_chemical(), person_id=user.id)
+                 for _ in range(chemicals)]
+        index_formulas(batch)
+        db.session.add_all(batch)
+        db.session.commit()
+        db.engine.dispose()
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def multipart(fields: dict, files: dict) -> tuple[bytes, str]:
+    boundary = uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f"--{boundary}\r\nContent-Disposition: form-data; "
+                     f"name=\"{name}\"\r\n\r\n{value}\r\n".encode())
+    for name, content in files.items():
+        parts.append(f"--{boundary}\r\nContent-Disposition: form-data; "
+                     f"name=\"{name}\"; filename=\"{name}.txt\"\r\n"
+                     f"Content-Type: text/plain\r\n\r\n".encode() + content + b"\r\n")
+    parts.append(f"--{boundary}--\r\n".encode())
+    return b"".join(parts), f"multipart/form-data; boundary={boundary}"
+
+
+class Client:
+    def __init__(self, base: str, args):
+        self.base = base
+        self.args = args
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+
+    def request(self, path: str, data: bytes = None, content_type: str = None) -> int:
+        req = urllib.request.Request(self.base + path, data=data)
+        if content_type:
+            req.add_header("Content-Type", content_type)
+        try:
+            with self.opener.open(req, timeout=self.args.timeout) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+
+    def login(self) -> int:
+        body = urllib.parse.urlencode(
+            dict(username=USERNAME, password=PASSWORD)).encode()
+        return self.request("/accounts/login", body, "application/x-www-form-urlencoded")
+
+    def search(self) -> int:
+        query = random_window() | dict(year_max=2100, month_max=1, day_max=1)
+        return self.request("/chemical/search", json.dumps(query).encode(), "application/json")
+
+    def view(self) -> int:
+        return self.request(f"/chemical/{random.randint(1, self.args.chemicals)}/view")
+
+    def batch(self) -> int:
+        lines = ["rt_min\trt_max\tmz_min\tmz_max\tmode"]
+        for _ in range(self.args.batch_queries):
+            w = random_window()
+            lines.append(f"{w['rt_min']}\t{w['rt_max']}\t{w['mz_min']}\t{w['mz_max']}\t"
+                         f"{random.choice(MODES)}")
+        body, content_type = multipart({}, {"input": "\n".join(lines).encode()})
+        return self.request("/chemical/batch", body, content_type)
+
+    def batchadd(self) -> int:
+        lines = ["\t".join(_insert_columns)]
+        for _ in range(self.args.batchadd_rows):
+            chemical = random_chemical()
+            chemical["msms_detected"] = "Yes" if chemical["msms_detected"] else "No"
+            lines.append("\t".join(str(chemical[k]) for k in _insert_columns))
+        body, content_type = multipart({"merge": "overwrite"},
+                                       {"input": "\n".join(lines).encode()})
+        return self.request("/chemical/batchadd", body, content_type)
+
+
+def run_client(base: str, args, mix: list[tuple[str, int]], deadline: float,
+               results: dict, lock: threading.Lock):
+    client = Client(base, args)
+    client.login()
+    names, weights = zip(*mix)
+    while time.perf_counter() < deadline:
+        endpoint = random.choices(names, weights)[0]
+        start = time.perf_counter()
+        try:
+            status = getattr(client, endpoint)()
+        except (urllib.error.URLError, OSError, http.client.HTTPException):
+            # e.g. IncompleteRead when a streamed response breaks off.
+            status = 0
+        elapsed = time.perf_counter() - start
+        with lock:
+            results[endpoint].append((elapsed, status))
+
+
+# log entries of a failed request and its path: Flask logs the exceptions of
+# its views, gunicorn those raised while a streamed response is sent.
+_error_entry = re.compile(r"(?:Exception on |Error handling request (?:[A-Z]+ )?)([^\s?]+)")
+
+
+def count_locks(log: str) -> dict[str, int]:
+    """
+    Counts "database is locked" failures per endpoint from the tracebacks
+    in the gunicorn error log.
+    """
+    paths = {"/chemical/search": "search", "/chemical/batchadd": "batchadd",
+             "/chemical/batch": "batch", "/accounts/login": "login"}
+    locks = {endpoint: 0 for endpoint in ENDPOINTS}
+    entries = list(_error_entry.finditer(log))
+    for entry, following in zip(entries, entries[1:] + [None]):
+        end = following.start() if following else len(log)
+        if "database is locked" not in log[entry.end():end]:
+            continue
+        path = entry.group(1)
+        if path in paths:
+            locks[paths[path]] += 1
+        elif path.endswith("/view"):
+            locks["view"] += 1
+    return locks
+
+
+def percentile(samples: list[float], p: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+def report(results: dict, locks: dict, duration: float):
+    print(f"{'endpoint':<10} {'requests':>8} {'req/s':>8} {'errors':>7} {'locks':>6}"
+          f" {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    total = 0
+    for endpoint in ENDPOINTS:
+        samples = results[endpoint]
+        if not samples:
+            continue
+        total += len(samples)
+        latencies = [s[0] * 1000 for s in samples]
+        errors = sum(1 for s in samples if s[1] != 200)
+        print(f"{endpoint:<10} {len(samples):>8} {len(samples) / duration:>8.1f}"
+              f" {errors / len(samples):>7.1%} {locks[endpoint] / len(samples):>6.1%}"
+              f" {percentile(latencies, 50):>8.1f} {percentile(latencies, 95):>8.1f}"
+              f" {percentile(latencies, 99):>8.1f}")
+    print(f"{'total':<10} {total:>8} {total / duration:>8.1f}")
+
+
+def parse_mix(value: str) -> list[tuple[str, int]]:
+    mix = []
+    for part in value.split(","):
+        name, weight = part.split("=")
+        if name not in ENDPOINTS:
+            raise argparse.ArgumentTypeError(f"Unknown endpoint {name}")
+        mix.append((name, int(weight)))
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=20,
+                        help="seconds of traffic")
+    parser.add_argument("--workers", type=int, default=2,
+                        help="gunicorn workers")
+    parser.add_argument("--mix", type=parse_mix,
+                        default=parse_mix("search=60,view=25,batch=8,batchadd=2,login=5"))
+    parser.add_argument("--chemicals", type=int, default=20000,
+                        help="chemicals seeded into the database")
+    parser.add_argument("--batch-queries", type=int, default=200,
+                        help="queries per batch search upload")
+    parser.add_argument("--batchadd-rows", type=int, default=500,
+                        help="rows per batch add upload")
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tree = os.path.join(tmp, "tree")
+        shutil.copytree(root, tree, ignore=shutil.ignore_patterns(
+            "instance", ".git", "__pycache__"))
+        print(f"Seeding {args.chemicals} chemicals...")
+        seed(tree, args.chemicals)
+
+        port = free_port()
+        log_path = os.path.join(tmp, "gunicorn.log")
+        with open(log_path, "w") as log:
+            server = subprocess.Popen(
+                ["gunicorn", "-c", "gunicorn.conf.py", "--chdir", tree,
+                 "-b", f"127.0.0.1:{port}", "-w", str(args.workers),
+                 "--timeout", str(int(args.timeout)), "app:app"],
+                cwd=tree, stdout=log, stderr=log)
+        base = f"http://127.0.0.1:{port}"
+        try:
+            for _ in range(100):
+                try:
+                    urllib.request.urlopen(base + "/search", timeout=1).read()
+                    break
+                except (urllib.error.URLError, OSError):
+                    time.sleep(0.1)
+            print(f"Running {args.clients} clients against {args.workers} "
+                  f"workers for {args.duration:.0f}s...")
+            results = {endpoint: [] for endpoint in ENDPOINTS}
+            lock = threading.Lock()
+            start = time.perf_counter()
+            deadline = start + args.duration
+            threads = [threading.Thread(target=run_client,
+                                        args=(base, args, args.mix, deadline, results, lock))
+                       for _ in range(args.clients)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            duration = time.perf_counter() - start
+        finally:
+            server.terminate()
+            server.wait()
+        with open(log_path) as log:
+            locks = count_locks(log.read())
+        report(results, locks, duration)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+"""
+Compares /chemical/search served by the Flask app on sync gunicorn workers
+with the asyncio search service (search_service.py) on uvicorn workers,
+under bursts of identical queries like those sent by many open search pages.
+
+Usage: python benchmarks/search.py --clients 64 --bursts 20
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+from loadtest import free_port, percentile, random_window, root, seed
+
+
+def burst(base: str, clients: int, query: bytes, latencies: list, errors: list):
+    barrier = threading.Barrier(clients)
+
+    def client():
+        req = urllib.request.Request(base + "/chemical/search", data=query,
+                                     headers={"Content-Type": "application/json"})
+        barrier.wait()
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req, timeout=60) as response:
+                response.read()
+            latencies.append(time.perf_counter() - start)
+        except (urllib.error.URLError, OSError):
+            errors.append(1)
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+
+def run(tree: str, name: str, worker_args: list[str], args):
+    port = free_port()
+    server = subprocess.Popen(
+        ["gunicorn", "-c", "gunicorn.conf.py", "--chdir", tree, "-b", f"127.0.0.1:{port}",
+         "-w", str(args.workers), "--backlog", "2048"] + worker_args,
+        cwd=tree, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    try:
+        for _ in range(100):
+            try:
+                urllib.request.urlopen(base + "/search", timeout=1).read()
+                break
+            except (urllib.error.URLError, OSError):
+                time.sleep(0.1)
+        latencies, errors = [], []
+        start = time.perf_counter()
+        for _ in range(args.bursts):
+            window = random_window()
+            # wide windows make each search scan many rows, as typed queries do.
+            window["rt_min"], window["rt_max"] = 0, 1000
+            window["mz_max"] = window["mz_min"] + 400
+            query = json.dumps(window | dict(year_max=2100, month_max=1, day_max=1)).encode()
+            burst(base, args.clients, query, latencies, errors)
+        elapsed = time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait()
+    ms = [x * 1000 for x in latencies]
+    print(f"{name:<28} {len(ms) / elapsed:8.1f} {len(errors):7} {percentile(ms, 50):8.1f}"
+          f" {percentile(ms, 99):8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--clients", type=int, default=64,
+                        help="identical requests per burst")
+    parser.add_argument("--bursts", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--chemicals", type=int, default=100000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tree = os.path.join(tmp, "tree")
+        shutil.copytree(root, tree, ignore=shutil.ignore_patterns(
+            "instance", ".git", "__pycache__"))
+        print(f"Seeding {args.chemicals} chemicals...")
+        seed(tree, args.chemicals)
+        print(f"{'':<28} {'req/s':>8} {'errors':>7} {'p50 ms':>8} {'p99 ms':>8}")
+        run(tree, "flask, sync workers", ["app:app"], args)
+        run(tree, "async search service", ["-k", "uvicorn.workers.UvicornWorker",
+                                           "search_service:application"], args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+"""
+Compares the columnar snapshot export and import with the row-oriented
+paths they replace: the /chemical/all JSON dump and the /chemical/batchadd
+TSV upload. Runs against a seeded throwaway copy of the repository.
+
+Usage: python benchmarks/snapshot.py [chemicals]
+"""
+
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from loadtest import USERNAME, root, random_chemical, seed
+
+_tsv_columns = ["metabolite_name", "formula", "monoisotopic_mass", "final_mz",
+                "final_rt", "final_adduct", "standard_grp", "msms_detected",
+                "inchikey", "inchikey14", "library", "mode"]
+
+
+def report(name: str, seconds: float, size: int = None):
+    line = f"{name:<28} {seconds * 1000:10.1f} ms"
+    if size is not None:
+        line += f" {size / 1024:10.1f} KiB"
+    print(line)
+
+
+def main(chemicals: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        tree = os.path.join(tmp, "tree")
+        shutil.copytree(root, tree, ignore=shutil.ignore_patterns(
+            "instance", ".git", "__pycache__"))
+        seed(tree, chemicals)
+        import snapshot
+        from app import app, db, Chemical, ChemicalElement, ChemicalIsotope
+
+        app.config["MAX_CONTENT_LENGTH"] = None
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session["user"] = session["admin"] = USERNAME
+
+        start = time.perf_counter()
+        response = client.get("/chemical/all")
+        report("export /chemical/all JSON", time.perf_counter() - start,
+               len(response.data))
+
+        snapshots = {}
+        with app.app_context():
+            for output in snapshot.FORMATS:
+                sink = io.BytesIO()
+                start = time.perf_counter()
+                with db.engine.connect() as connection:
+                    snapshot.write_snapshot(
+                        connection, Chemical.__table__, sink, format=output)
+                report(f"export {output}", time.perf_counter() - start,
+                       len(sink.getvalue()))
+                snapshots[output] = sink.getvalue()
+
+            def clear():
+                with db.engine.begin() as connection:
+                    connection.execute(ChemicalElement.__table__.delete())
+                    connection.execute(ChemicalIsotope.__table__.delete())
+                    connection.execute(Chemical.__table__.delete())
+
+            for output, data in snapshots.items():
+                clear()
+                start = time.perf_counter()
+                with db.engine.begin() as connection:
+                    snapshot.read_snapshot(connection, Chemical.__table__,
+                                           ChemicalElement.__table__,
+                                           ChemicalIsotope.__table__, io.BytesIO(data))
+                report(f"import {output}", time.perf_counter() - start)
+            clear()
+            db.engine.dispose()
+
+        lines = ["\t".join(_tsv_columns)]
+        for _ in range(chemicals):
+            chemical = random_chemical()
+            chemical["msms_detected"] = "Yes" if chemical["msms_detected"] else "No"
+            lines.append("\t".join(str(chemical[k]) for k in _tsv_columns))
+        start = time.perf_counter()
+        response = client.post("/chemical/batchadd", content_type="multipart/form-data", data={
+            "input": (io.BytesIO("\n".join(lines).encode()), "input.txt"),
+            "merge": "overwrite"})
+        assert response.status_code == 200
+        report("import /chemical/batchadd", time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
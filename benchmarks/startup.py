@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+
+"""
+Measures container startup cost: importing app.py, and bringing the database
+up to date with initialize_db.py compared to the previous
+create_all + `flask db upgrade` sequence.
+
+Runs against a throwaway copy of the repository, so the real instance/
+database is never touched.
+
+Usage: python benchmarks/startup.py [runs]
+"""
+
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def timed(args: list[str], cwd: str) -> float:
+    env = os.environ | {"FLASK_APP": "app.py"}
+    start = time.perf_counter()
+    subprocess.run(args, cwd=cwd, env=env, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def report(name: str, samples: list[float]):
+    print(f"{name:<40} median {statistics.median(samples) * 1000:8.1f} ms"
+          f"   min {min(samples) * 1000:8.1f} ms")
+
+
+def main(runs: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        tree = os.path.join(tmp, "tree")
+        shutil.copytree(root, tree, ignore=shutil.ignore_patterns(
+            "instance", ".git", "__pycache__"))
+        db = os.path.join(tree, "instance", "project.db")
+
+        report("import app", [timed([sys.executable, "-c", "import app"], tree)
+                              for _ in range(runs)])
+
+        fresh = []
+        for _ in range(runs):
+            if os.path.exists(db):
+                os.remove(db)
+            fresh.append(timed([sys.executable, "initialize_db.py"], tree))
+        report("initialize_db.py (new database)", fresh)
+        report("initialize_db.py (already at head)",
+               [timed([sys.executable, "initialize_db.py"], tree) for _ in range(runs)])
+
+        legacy = []
+        for _ in range(runs):
+            legacy.append(
+                timed([sys.executable, "-c",
+                       "from app import app, db\n"
+                       "with app.app_context(): db.create_all()"], tree)
+                + timed(["flask", "db", "upgrade"], tree))
+        report("create_all + flask db upgrade (at head)", legacy)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
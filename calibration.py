@@ -0,0 +1,72 @@
+from typing import Sequence
+
+"""
+Retention time calibration. The retention times of a library and mode are
+mapped onto a common scale by a piecewise linear function fitted to anchor
+compounds whose reference retention time is known, so that results from
+different chromatographic runs can be searched with the same tight window.
+numpy is only imported when a calibration is fitted or applied.
+"""
+
+# "linear" fits a single least-squares line; "isotonic" follows the anchors
+# with a monotonic (order preserving) piecewise linear function.
+METHODS = ("linear", "isotonic")
+
+
+def _isotonic(y, w):
+    # pool adjacent violators: the non-decreasing sequence closest to y.
+    blocks: list[list[float]] = []  # [mean, weight, length]
+    for value, weight in zip(y, w):
+        blocks.append([value, weight, 1])
+        while len(blocks) > 1 and blocks[-2][0] > blocks[-1][0]:
+            mean, weight, length = blocks.pop()
+            last = blocks[-1]
+            total = last[1] + weight
+            last[0] = (last[0] * last[1] + mean * weight) / total
+            last[1], last[2] = total, last[2] + length
+    return [mean for mean, _, length in blocks for _ in range(length)]
+
+
+def fit(raw: Sequence[float], reference: Sequence[float], method: str = "linear") -> list[list[float]]:
+    """
+    Fits a calibration from the raw and reference retention times of anchor
+    compounds. Returns its knots as [[raw, calibrated], ...] sorted by raw.
+    Raises ValueError if there are not enough distinct anchors.
+    """
+    import numpy as np
+    if method not in METHODS:
+        raise ValueError(f"Unknown calibration method {method}")
+    raw, reference = np.asarray(raw, dtype=float), np.asarray(reference, dtype=float)
+    # anchors measured at the same raw time are averaged.
+    knots, inverse, counts = np.unique(raw, return_inverse=True, return_counts=True)
+    if len(knots) < 2:
+        raise ValueError("At least two anchors with distinct retention times are required")
+    means = np.bincount(inverse, weights=reference) / counts
+    if method == "linear":
+        slope, intercept = np.polyfit(knots, means, 1, w=np.sqrt(counts))
+        knots = knots[[0, -1]]
+        values = slope * knots + intercept
+    else:
+        values = np.array(_isotonic(means, counts))
+    return [[float(x), float(y)] for x, y in zip(knots, values)]
+
+
+def apply(knots: list[list[float]], rt: Sequence[float]):
+    """
+    Maps raw retention times through a calibration, as a numpy array. Times
+    outside the anchors are extrapolated along the first or last segment.
+    """
+    import numpy as np
+    rt = np.asarray(rt, dtype=float)
+    x, y = np.array(knots, dtype=float).T
+    calibrated = np.interp(rt, x, y)
+    below, above = rt < x[0], rt > x[-1]
+    calibrated[below] = y[0] + (rt[below] - x[0]) * (y[1] - y[0]) / (x[1] - x[0])
+    calibrated[above] = y[-1] + (rt[above] - x[-1]) * (y[-1] - y[-2]) / (x[-1] - x[-2])
+    return calibrated
+
+
+def rms_error(knots: list[list[float]], raw: Sequence[float], reference: Sequence[float]) -> float:
+    """Root mean square difference between calibrated and reference times."""
+    import numpy as np
+    return float(np.sqrt(np.mean((apply(knots, raw) - np.asarray(reference, dtype=float)) ** 2)))
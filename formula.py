@@ -0,0 +1,81 @@
+import re
+
+"""
+Parsing of molecular formulas (e.g. "C11H15N2O8P", "Ca(OH)2", "CuSO4.5H2O")
+into element counts so that they can be stored in an indexable form.
+"""
+
+ELEMENTS = frozenset("""
+H He Li Be B C N O F Ne Na Mg Al Si P S Cl Ar K Ca Sc Ti V Cr Mn Fe Co Ni Cu
+Zn Ga Ge As Se Br Kr Rb Sr Y Zr Nb Mo Tc Ru Rh Pd Ag Cd In Sn Sb Te I Xe Cs Ba
+La Ce Pr Nd Pm Sm Eu Gd Tb Dy Ho Er Tm Yb Lu Hf Ta W Re Os Ir Pt Au Hg Tl Pb
+Bi Po At Rn Fr Ra Ac Th Pa U Np Pu Am Cm Bk Cf Es Fm Md No Lr Rf Db Sg Bh Hs
+Mt Ds Rg Cn Nh Fl Mc Lv Ts Og D T
+""".split())
+
+_token = re.compile(r"([A-Z][a-z]?)|(\d+)|([(\[])|([)\]])")
+_count = re.compile(r"\d+")
+# trailing charge annotations such as "+", "-" or "+2" are not part of the
+# elemental composition.
+_charge = re.compile(r"[+-]+\d*$")
+
+
+def _parse_group(formula: str, original: str) -> dict[str, int]:
+    stack: list[dict[str, int]] = [{}]
+    pos = 0
+    while pos < len(formula):
+        match = _token.match(formula, pos)
+        if match is None:
+            raise ValueError(
+                f"Formula {original} has an unexpected character \"{formula[pos]}\"")
+        element, number, opening, closing = match.groups()
+        pos = match.end()
+        # an optional count may follow an element or a closing bracket.
+        count_match = _count.match(formula, pos)
+        count = 1
+        if count_match and (element or closing):
+            count = int(count_match.group())
+            pos = count_match.end()
+        if element:
+            if element not in ELEMENTS:
+                raise ValueError(
+                    f"Formula {original} contains an unknown element {element}")
+            stack[-1][element] = stack[-1].get(element, 0) + count
+        elif opening:
+            stack.append({})
+        elif closing:
+            if len(stack) == 1:
+                raise ValueError(f"Formula {original} has unbalanced brackets")
+            group = stack.pop()
+            for k, v in group.items():
+                stack[-1][k] = stack[-1].get(k, 0) + v * count
+        else:
+            raise ValueError(
+                f"Formula {original} has a misplaced number {number}")
+    if len(stack) != 1:
+        raise ValueError(f"Formula {original} has unbalanced brackets")
+    return stack[0]
+
+
+def parse_formula(formula: str) -> dict[str, int]:
+    """
+    Returns a mapping of element symbol to atom count. Hydrates and adducts
+    separated by "." or "·" may carry a leading multiplier (e.g. "5H2O").
+    Raises ValueError if the formula can not be parsed.
+    """
+    stripped = "".join(formula.split())
+    stripped = _charge.sub("", stripped)
+    if not stripped:
+        raise ValueError(f"Formula \"{formula}\" is empty")
+    counts: dict[str, int] = {}
+    for part in re.split(r"[.·*]", stripped):
+        multiplier_match = _count.match(part)
+        multiplier = 1
+        if multiplier_match:
+            multiplier = int(multiplier_match.group())
+            part = part[multiplier_match.end():]
+        if not part:
+            raise ValueError(f"Formula {formula} has an empty component")
+        for k, v in _parse_group(part, formula).items():
+            counts[k] = counts.get(k, 0) + v * multiplier
+    return {k: v for k, v in counts.items() if v > 0}
@@ -0,0 +1,24 @@
+# gunicorn settings for the docker image. The number of workers can be set
+# with the WEB_CONCURRENCY environment variable.
+
+bind = "0.0.0.0:5000"
+chdir = "/app"
+
+# import the app once in the master process and fork the workers from it,
+# instead of having every worker import it again.
+preload_app = True
+
+
+def post_fork(server, worker):
+    # connections must not be shared between forked processes.
+    from app import app, db
+    with app.app_context():
+        db.engine.dispose()
+
+
+def when_ready(server):
+    # compile every template once in the master, so that forked workers
+    # start with them already loaded.
+    from app import app
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
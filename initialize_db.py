@@ -1,6 +1,42 @@
 #!/usr/bin/env python3
 
-from app import app, db
+"""
+Brings the database up to date on container start. The Alembic revision is
+checked once, and nothing is done if the database is already at head.
+"""
+
+from alembic.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from flask_migrate import stamp, upgrade
+from sqlalchemy import inspect
+
+from app import app, db, migrate
+
+# the head revision when databases were still created without being stamped.
+UNVERSIONED = "70947667e6b3"
 
 with app.app_context():
-    db.create_all()
+    with db.engine.connect() as connection:
+        current = MigrationContext.configure(connection).get_current_revision()
+        tables = set(inspect(connection).get_table_names()) - {"alembic_version"}
+    head = ScriptDirectory.from_config(migrate.get_config()).get_current_head()
+
+    if current == head:
+        print(f"Database is at head revision {head}, nothing to do.")
+    elif current is not None:
+        print(f"Upgrading database from {current} to {head}.")
+        upgrade()
+    elif not tables:
+        # a brand new database: create it from the models directly instead of
+        # replaying every migration.
+        print(f"Creating a new database at revision {head}.")
+        db.create_all()
+        stamp()
+    else:
+        # an existing database that was created with create_all and never
+        # stamped, which matches the last revision before they were stamped.
+        # Replaying the later migrations adds the tables, columns, indexes
+        # and derived rows that create_all can't add to existing tables.
+        print(f"Adopting an unversioned database at revision {UNVERSIONED}.")
+        stamp(revision=UNVERSIONED)
+        upgrade()
@@ -0,0 +1,162 @@
+from typing import Optional
+
+"""
+Theoretical isotope envelopes (M+0, M+1, M+2, ...) of molecular formulas,
+computed for many formulas at once with numpy so that batch loads pay for a
+few array operations per element instead of a convolution per chemical.
+numpy is only imported when envelopes are actually computed.
+"""
+
+# (exact mass, natural abundance) of the stable isotopes of each element,
+# lightest first. Formulas with elements missing here get no envelope.
+ISOTOPES: dict[str, list[tuple[float, float]]] = {
+    "H": [(1.00782503207, 0.999885), (2.0141017778, 0.000115)],
+    "D": [(2.0141017778, 1.0)],
+    "T": [(3.0160492777, 1.0)],
+    "Li": [(6.015122795, 0.0759), (7.01600455, 0.9241)],
+    "B": [(10.0129370, 0.199), (11.0093054, 0.801)],
+    "C": [(12.0, 0.9893), (13.0033548378, 0.0107)],
+    "N": [(14.0030740048, 0.99636), (15.0001088982, 0.00364)],
+    "O": [(15.99491461956, 0.99757), (16.99913170, 0.00038), (17.9991610, 0.00205)],
+    "F": [(18.99840322, 1.0)],
+    "Na": [(22.9897692809, 1.0)],
+    "Mg": [(23.985041700, 0.7899), (24.98583692, 0.1000), (25.982592929, 0.1101)],
+    "Al": [(26.98153863, 1.0)],
+    "Si": [(27.9769265325, 0.92223), (28.976494700, 0.04685), (29.97377017, 0.03092)],
+    "P": [(30.97376163, 1.0)],
+    "S": [(31.97207100, 0.9499), (32.97145876, 0.0075), (33.96786690, 0.0425),
+          (35.96708076, 0.0001)],
+    "Cl": [(34.96885268, 0.7576), (36.96590259, 0.2424)],
+    "K": [(38.96370668, 0.932581), (39.96399848, 0.000117), (40.96182576, 0.067302)],
+    "Ca": [(39.96259098, 0.96941), (41.95861801, 0.00647), (42.9587666, 0.00135),
+           (43.9554818, 0.02086), (45.9536926, 0.00004), (47.952534, 0.00187)],
+    "Cr": [(49.9460442, 0.04345), (51.9405075, 0.83789), (52.9406494, 0.09501),
+           (53.9388804, 0.02365)],
+    "Mn": [(54.9380451, 1.0)],
+    "Fe": [(53.9396105, 0.05845), (55.9349375, 0.91754), (56.9353940, 0.02119),
+           (57.9332756, 0.00282)],
+    "Co": [(58.9331950, 1.0)],
+    "Ni": [(57.9353429, 0.680769), (59.9307864, 0.262231), (60.9310560, 0.011399),
+           (61.9283451, 0.036345), (63.9279660, 0.009256)],
+    "Cu": [(62.9295975, 0.6915), (64.9277895, 0.3085)],
+    "Zn": [(63.9291422, 0.48268), (65.9260334, 0.27975), (66.9271273, 0.04102),
+           (67.9248442, 0.19024), (69.9253193, 0.00631)],
+    "As": [(74.9215965, 1.0)],
+    "Se": [(73.9224764, 0.0089), (75.9192136, 0.0937), (76.9199140, 0.0763),
+           (77.9173091, 0.2377), (79.9165213, 0.4961), (81.9166994, 0.0873)],
+    "Br": [(78.9183371, 0.5069), (80.9162906, 0.4931)],
+    "Ag": [(106.905097, 0.51839), (108.904752, 0.48161)],
+    "I": [(126.904473, 1.0)],
+    "Cs": [(132.905451933, 1.0)],
+}
+
+# peaks above the monoisotopic one that are kept (M+1 ... M+PEAKS).
+PEAKS = 4
+# peaks with a smaller share of the whole envelope are not stored.
+MIN_ABUNDANCE = 1e-5
+
+
+def _atom(element: str, bins: int):
+    """
+    Abundance and abundance-weighted mass offset (from the lightest isotope)
+    of one atom, binned by nominal mass above the lightest isotope.
+    """
+    import numpy as np
+    abundance, moment = np.zeros(bins), np.zeros(bins)
+    lightest = ISOTOPES[element][0][0]
+    for mass, share in ISOTOPES[element]:
+        k = round(mass - lightest)
+        if k < bins:
+            abundance[k] += share
+            moment[k] += share * (mass - lightest)
+    return abundance, moment
+
+
+def _monoisotopic(element: str) -> tuple[int, float]:
+    """Nominal and exact mass of the most abundant isotope above the lightest."""
+    lightest = ISOTOPES[element][0][0]
+    mass = max(ISOTOPES[element], key=lambda x: x[1])[0]
+    return round(mass - lightest), mass - lightest
+
+
+def _convolve(a1, w1, a2, w2):
+    # row-wise convolution of two batches of binned distributions, truncated
+    # to their width. w carries the abundance-weighted mass offsets along.
+    import numpy as np
+    bins = a1.shape[1]
+    a, w = np.zeros_like(a1), np.zeros_like(a1)
+    for j in range(bins):
+        a[:, j:] += a1[:, j:j + 1] * a2[:, :bins - j]
+        w[:, j:] += w1[:, j:j + 1] * a2[:, :bins - j] + a1[:, j:j + 1] * w2[:, :bins - j]
+    return a, w
+
+
+def envelopes(compositions: list[dict[str, int]]) -> list[Optional[list[dict]]]:
+    """
+    Computes the isotope envelope of every element composition (as returned
+    by formula.parse_formula). Each envelope is a list of peaks
+    {"shift": k, "abundance": p, "mass_shift": d} where k is the nominal mass
+    difference from the monoisotopic peak (negative for elements such as B
+    whose lightest isotope is not the most abundant), p the share of all
+    molecules in the peak and d its exact mass difference in Da. Compositions
+    with elements lacking isotope data get None.
+    """
+    import numpy as np
+    result: list[Optional[list[dict]]] = [None] * len(compositions)
+    rows = [i for i, counts in enumerate(compositions)
+            if counts and all(k in ISOTOPES for k in counts)]
+    if not rows:
+        return result
+    elements = sorted({k for i in rows for k in compositions[i]})
+    counts = np.array([[compositions[i].get(k, 0) for k in elements] for i in rows],
+                      dtype=np.int64)
+    mono = [_monoisotopic(k) for k in elements]
+    # nominal and exact mass of each monoisotopic peak above the all-lightest
+    # isotope composition, which is bin 0 below.
+    offset = counts @ np.array([m[0] for m in mono], dtype=np.int64)
+    mono_mass = counts @ np.array([m[1] for m in mono])
+    bins = int(offset.max()) + PEAKS + 1
+
+    n = len(rows)
+    abundance = np.zeros((n, bins))
+    abundance[:, 0] = 1
+    moment = np.zeros((n, bins))
+    for e, element in enumerate(elements):
+        # exponentiation by squaring, for every row at once.
+        atom_a, atom_w = _atom(element, bins)
+        base_a, base_w = np.tile(atom_a, (n, 1)), np.tile(atom_w, (n, 1))
+        count = counts[:, e]
+        for bit in range(int(count.max()).bit_length()):
+            use = (count >> bit) & 1 == 1
+            if use.any():
+                a, w = _convolve(abundance[use], moment[use], base_a[use], base_w[use])
+                abundance[use], moment[use] = a, w
+            if (count >> (bit + 1)).any():
+                base_a, base_w = _convolve(base_a, base_w, base_a, base_w)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mass_shift = moment / abundance - mono_mass[:, None]
+    shift = np.arange(bins)[None, :] - offset[:, None]
+    keep = (abundance >= MIN_ABUNDANCE) & (shift <= PEAKS)
+    for r, k in zip(*np.nonzero(keep)):
+        i = rows[r]
+        if result[i] is None:
+            result[i] = []
+        result[i].append(dict(shift=int(shift[r, k]), abundance=float(abundance[r, k]),
+                              mass_shift=float(mass_shift[r, k])))
+    return result
+
+
+def score(expected: dict[int, float], observed: list[float]) -> float:
+    """
+    Agreement (0 to 1) between observed intensities of M+0, M+1, ... and the
+    expected abundances by shift: 1 minus the largest difference between
+    them once both are scaled to their most intense peak.
+    """
+    peaks = [expected.get(k, 0.0) for k in range(len(observed))]
+    observed = [max(float(x), 0.0) for x in observed]
+    top_e, top_o = max(peaks), max(observed)
+    if not top_e or not top_o:
+        return 0.0
+    return max(0.0, 1.0 - max(abs(e / top_e - o / top_o)
+                              for e, o in zip(peaks, observed)))
@@ -0,0 +1,58 @@
+"""parsed formula element counts
+
+Revision ID: 3c1f8e2a9b47
+Revises: 70947667e6b3
+Create Date: 2026-10-19 10:12:41.208315
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from formula import parse_formula
+
+
+# revision identifiers, used by Alembic.
+revision = '3c1f8e2a9b47'
+down_revision = '70947667e6b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    chemical_element = op.create_table('chemical_element',
+    sa.Column('chemical_id', sa.Integer(), nullable=False),
+    sa.Column('element', sa.String(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['chemical_id'], ['chemical.id'], ),
+    sa.PrimaryKeyConstraint('chemical_id', 'element')
+    )
+    with op.batch_alter_table('chemical_element', schema=None) as batch_op:
+        batch_op.create_index('ix_chemical_element_element_count', ['element', 'count', 'chemical_id'], unique=False)
+
+    with op.batch_alter_table('chemical', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_chemical_final_mz'), ['final_mz'], unique=False)
+        batch_op.create_index(batch_op.f('ix_chemical_final_rt'), ['final_rt'], unique=False)
+
+    # backfill the element counts of existing chemicals. Formulas that can not
+    # be parsed are left without counts.
+    rows = []
+    for chemical_id, formula in op.get_bind().execute(sa.text("SELECT id, formula FROM chemical")):
+        try:
+            counts = parse_formula(formula)
+        except ValueError:
+            continue
+        rows.extend(dict(chemical_id=chemical_id, element=k, count=v)
+                    for k, v in counts.items())
+    if rows:
+        op.bulk_insert(chemical_element, rows)
+
+
+def downgrade():
+    with op.batch_alter_table('chemical', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_chemical_final_rt'))
+        batch_op.drop_index(batch_op.f('ix_chemical_final_mz'))
+
+    with op.batch_alter_table('chemical_element', schema=None) as batch_op:
+        batch_op.drop_index('ix_chemical_element_element_count')
+
+    op.drop_table('chemical_element')
@@ -0,0 +1,53 @@
+"""chemical isotope envelopes
+
+Revision ID: c7f2a1e94d38
+Revises: b5a0c3d8e612
+Create Date: 2026-10-19 18:04:52.731209
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+import isotopes
+from formula import parse_formula
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7f2a1e94d38'
+down_revision = 'b5a0c3d8e612'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    chemical_isotope = op.create_table('chemical_isotope',
+    sa.Column('chemical_id', sa.Integer(), nullable=False),
+    sa.Column('shift', sa.Integer(), nullable=False),
+    sa.Column('abundance', sa.Float(), nullable=False),
+    sa.Column('mass_shift', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['chemical_id'], ['chemical.id'], ),
+    sa.PrimaryKeyConstraint('chemical_id', 'shift')
+    )
+
+    # backfill the envelopes of existing chemicals, a batch at a time.
+    # Formulas that can not be parsed are left without an envelope.
+    result = op.get_bind().execute(sa.text("SELECT id, formula FROM chemical"))
+    while True:
+        batch = result.fetchmany(5000)
+        if not batch:
+            break
+        compositions = []
+        for _, formula in batch:
+            try:
+                compositions.append(parse_formula(formula))
+            except ValueError:
+                compositions.append({})
+        rows = []
+        for (chemical_id, _), envelope in zip(batch, isotopes.envelopes(compositions)):
+            rows.extend(dict(peak, chemical_id=chemical_id) for peak in envelope or [])
+        if rows:
+            op.bulk_insert(chemical_isotope, rows)
+
+
+def downgrade():
+    op.drop_table('chemical_isotope')
@@ -0,0 +1,159 @@
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Hashable, Optional
+
+from asgiref.wsgi import WsgiToAsgi
+
+from app import app, search_chemicals
+
+"""
+An asyncio (ASGI) front for the Flask app that serves POST /chemical/search
+itself and hands every other request to Flask. Identical searches that are
+in flight at the same time run once, searches whose clients have all gone
+away are cancelled, and at most SEARCH_CONCURRENCY searches hit the database
+at once. Run it with
+
+    gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker search_service:application
+"""
+
+SEARCH_PATH = "/chemical/search"
+
+_search_fields = ("mz_min", "mz_max", "rt_min", "rt_max")
+# a search is a handful of numbers. Flask's MAX_CONTENT_LENGTH does not
+# apply to this path, so larger bodies are refused here.
+MAX_BODY = 16 * 1024
+
+
+class SingleFlight:
+    """
+    Shares one execution of a coroutine between all concurrent callers with
+    the same key. The execution is cancelled once no caller is waiting.
+    """
+
+    def __init__(self):
+        self._calls: dict[Hashable, list] = {}
+
+    def __len__(self):
+        return len(self._calls)
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable]):
+        call = self._calls.get(key)
+        if call is None:
+            # [task, number of waiting callers]
+            call = [asyncio.ensure_future(fn()), 0]
+            self._calls[key] = call
+            call[0].add_done_callback(lambda _: self._forget(key, call))
+        call[1] += 1
+        try:
+            return await asyncio.shield(call[0])
+        finally:
+            call[1] -= 1
+            if call[1] == 0 and not call[0].done():
+                self._forget(key, call)
+                call[0].cancel()
+
+    def _forget(self, key: Hashable, call: list):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+
+class SearchService:
+    def __init__(self, fallback, concurrency: int = 4):
+        self.fallback = fallback
+        self.concurrency = concurrency
+        self.flights = SingleFlight()
+        self.executor = ThreadPoolExecutor(
+            max_workers=concurrency, thread_name_prefix="search")
+        # created on first use, inside the worker's event loop.
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self.lifespan(receive, send)
+        if scope["type"] == "http" and scope["path"] == SEARCH_PATH and scope["method"] == "POST":
+            return await self.search(scope, receive, send)
+        return await self.fallback(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def run_search(self, query: dict, calibrated: bool, root_path: str) -> list[dict]:
+        urls = app.url_map.bind("localhost", script_name=root_path or "/")
+        with app.app_context():
+            result = search_chemicals(*(query[k] for k in _search_fields), calibrated)
+            return [{"id": x.id, "url": urls.build("chemical_view", {"id": x.id}),
+                     "name": x.metabolite_name, "mz": x.final_mz, "rt": x.final_rt,
+                     "calibrated_rt": x.calibrated_rt}
+                    for x in result]
+
+    async def execute(self, query: dict, calibrated: bool, root_path: str) -> bytes:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        # cancellation while queued here drops the search before it starts.
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(
+                self.executor, self.run_search, query, calibrated, root_path)
+        return json.dumps(result).encode()
+
+    async def search(self, scope, receive, send):
+        parts, size = [], 0
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            part = message.get("body", b"")
+            size += len(part)
+            if size > MAX_BODY:
+                return await respond(send, 413, json.dumps(
+                    {"error": f"Request body is larger than {MAX_BODY} bytes"}).encode())
+            parts.append(part)
+            if not message.get("more_body"):
+                break
+        try:
+            query = json.loads(b"".join(parts) or b"null")
+            if query is None:
+                return await respond(send, 200, b"[]")
+            calibrated = bool(query.get("calibrated"))
+            query = {k: float(query[k]) for k in _search_fields}
+        except (ValueError, TypeError, KeyError, AttributeError) as e:
+            return await respond(send, 400, json.dumps({"error": str(e)}).encode())
+
+        root_path = scope.get("root_path", "")
+        key = (root_path, calibrated) + tuple(query[k] for k in _search_fields)
+        result = asyncio.ensure_future(self.flights.do(
+            key, lambda: self.execute(query, calibrated, root_path)))
+        disconnect = asyncio.ensure_future(wait_for_disconnect(receive))
+        await asyncio.wait({result, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+        if not result.done():
+            # the client went away; stop waiting for (and maybe running) it.
+            result.cancel()
+            return
+        disconnect.cancel()
+        await respond(send, 200, result.result())
+
+
+async def wait_for_disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+async def respond(send, status: int, body: bytes):
+    await send({"type": "http.response.start", "status": status, "headers": [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(body)).encode()),
+    ]})
+    await send({"type": "http.response.body", "body": body})
+
+
+application = SearchService(
+    WsgiToAsgi(app), concurrency=int(os.getenv("SEARCH_CONCURRENCY", "4")))
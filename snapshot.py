@@ -0,0 +1,143 @@
+from typing import BinaryIO, Optional
+
+import sqlalchemy as sa
+
+import isotopes
+from formula import parse_formula
+
+"""
+Columnar (Parquet or Arrow IPC) snapshots of the chemical table. pyarrow is
+only imported when a snapshot is actually written or read.
+"""
+
+FORMATS = ("parquet", "arrow")
+
+# low-cardinality string columns that are dictionary-encoded.
+_dictionary_columns = {"mode", "library", "final_adduct"}
+
+_parquet_magic = b"PAR1"
+_arrow_magic = b"ARROW1"
+
+
+def _arrow_type(column: sa.Column):
+    import pyarrow as pa
+    if column.name in _dictionary_columns:
+        return pa.dictionary(pa.int32(), pa.string())
+    if isinstance(column.type, sa.Boolean):
+        return pa.bool_()
+    if isinstance(column.type, sa.Integer):
+        return pa.int64()
+    if isinstance(column.type, sa.Float):
+        return pa.float64()
+    if isinstance(column.type, sa.Date):
+        return pa.date32()
+    if isinstance(column.type, sa.String):
+        return pa.string()
+    raise ValueError(f"Column {column.name} has unsupported type {column.type}")
+
+
+def snapshot_schema(table: sa.Table):
+    import pyarrow as pa
+    return pa.schema([pa.field(c.name, _arrow_type(c), nullable=c.nullable)
+                      for c in table.columns])
+
+
+def write_snapshot(connection, table: sa.Table, sink: BinaryIO,
+                   format: str = "parquet", batch_size: int = 50000,
+                   metadata: Optional[dict] = None) -> int:
+    """
+    Streams every row of table into sink, batch_size rows at a time, and
+    returns the number of rows written. metadata is stored in the file's
+    schema as strings.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    if format not in FORMATS:
+        raise ValueError(f"Unknown snapshot format {format}")
+    schema = snapshot_schema(table)
+    if metadata:
+        schema = schema.with_metadata(
+            {k: str(v) for k, v in metadata.items()})
+    if format == "parquet":
+        writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    else:
+        writer = pa.ipc.new_file(sink, schema, options=pa.ipc.IpcWriteOptions(
+            compression="zstd"))
+    rows = 0
+    result = connection.execution_options(stream_results=True).execute(
+        sa.select(table).order_by(table.c.id))
+    with writer:
+        for partition in result.mappings().partitions(batch_size):
+            batch = pa.RecordBatch.from_pylist(
+                [dict(row) for row in partition], schema=schema)
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    return rows
+
+
+def read_metadata(source: BinaryIO) -> dict[str, str]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    magic = source.read(6)
+    source.seek(0)
+    if magic.startswith(_parquet_magic):
+        metadata = pq.read_schema(source).metadata
+    elif magic == _arrow_magic:
+        metadata = pa.ipc.open_file(source).schema.metadata
+    else:
+        raise ValueError("File is neither a Parquet nor an Arrow snapshot")
+    source.seek(0)
+    return {k.decode(): v.decode() for k, v in (metadata or {}).items()}
+
+
+def _read_batches(source: BinaryIO):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    magic = source.read(6)
+    source.seek(0)
+    if magic.startswith(_parquet_magic):
+        yield from pq.ParquetFile(source).iter_batches()
+    elif magic == _arrow_magic:
+        reader = pa.ipc.open_file(source)
+        for i in range(reader.num_record_batches):
+            yield reader.get_batch(i)
+    else:
+        raise ValueError("File is neither a Parquet nor an Arrow snapshot")
+
+
+def read_snapshot(connection, table: sa.Table, element_table: sa.Table,
+                  isotope_table: sa.Table, source: BinaryIO) -> int:
+    """
+    Bulk loads a snapshot into an empty table, keeping the original ids, and
+    builds the element counts and isotope envelope of every formula. Returns
+    the number of rows.
+    """
+    if connection.execute(sa.select(sa.func.count()).select_from(table)).scalar():
+        raise ValueError(f"Table {table.name} is not empty")
+    columns = {c.name for c in table.columns}
+    rows = 0
+    for batch in _read_batches(source):
+        chemicals = [{k: v for k, v in row.items() if k in columns}
+                     for row in batch.to_pylist()]
+        if not chemicals:
+            continue
+        compositions = []
+        for chemical in chemicals:
+            try:
+                compositions.append(parse_formula(chemical["formula"]))
+            except ValueError:
+                compositions.append({})
+        elements, peaks = [], []
+        for chemical, counts, envelope in zip(
+                chemicals, compositions, isotopes.envelopes(compositions)):
+            elements.extend(dict(chemical_id=chemical["id"], element=k, count=v)
+                            for k, v in counts.items())
+            peaks.extend(dict(peak, chemical_id=chemical["id"])
+                         for peak in envelope or [])
+        connection.execute(table.insert(), chemicals)
+        if elements:
+            connection.execute(element_table.insert(), elements)
+        if peaks:
+            connection.execute(isotope_table.insert(), peaks)
+        rows += len(chemicals)
+    return rows
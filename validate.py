@@ -1,4 +1,5 @@
 import csv
+from formula import parse_formula
 
 """
 Required fields when inserting into the database.
@@ -7,7 +8,8 @@ Required fields when inserting into the database.
 _required_fields = [
     # the "str" type means that this field can be any valid string.
     ("metabolite_name",     "str"),
-    ("formula",             "str"),
+    # must be a parseable molecular formula such as C6H12O6.
+    ("formula",             "formula"),
     # any field labeled a "float" needs to have a value in decimal notation.
     ("monoisotopic_mass",                "float"),
     ("mode",                "str"),
@@ -79,6 +81,12 @@ def _validate_type(field: str, value: str, t):
         except ValueError:
             raise ValueError(
                 f"Float field {field} does not have a valid value {value}")
+    elif t == "formula":
+        try:
+            parse_formula(value)
+            return value
+        except ValueError as e:
+            raise ValueError(f"Formula field {field}: {e}")
     elif t == "str":
         return value
     else: